@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import tomllib
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from mesh_cache import load_cached
+from serializer import record_outputs
+from image_sampling import frame_paths
+from build_state import STATE_FILE, code_hash, is_current, load_state, prune, record, save_state
+
+## runs many generator jobs from a manifest (.json or .toml) across worker processes.
+## the manifest has an optional workers count, an optional state file (see build_state) and
+## a list of jobs, each job is the keyword arguments of one generator plus its type and an
+## optional name to report it by:
+##
+##   workers = 4
+##
+##   [[jobs]]
+##   type = "obj"
+##   in_name = "models/tree.obj"
+##   out_name = "tree.mcfunction"
+##   particle = "flame"
+##   density = 0.1
+##   scale = 5
+##
+## jobs whose parameters, inputs and outputs haven't changed since their last build are skipped.
+## .obj sources are parsed once per source and scale into the mesh cache before the jobs start,
+## so jobs sharing a model all load the cached arrays instead of parsing it again
+
+GENERATORS = {
+    'obj': ('from_obj', 'create_mcfunction'),
+    'obj_lod': ('from_obj', 'create_lod_mcfunctions'),
+    'image': ('from_image', 'create_mcfunction'),
+    'image_sequence': ('from_image', 'create_sequence_mcfunctions'),
+    'spike': ('spikes', 'create_mcfunction'),
+    'sphere': ('spheres', 'create_files'),
+}
+
+## the job arguments that name input files
+INPUTS = {
+    'obj': ('in_name',),
+    'obj_lod': ('in_name',),
+    'image': ('img',),
+    'image_sequence': ('source',),
+}
+
+
+def load_manifest (path):
+    with open(path, 'rb') as file:
+        if path.endswith('.toml'):
+            manifest = tomllib.load(file)
+        else:
+            manifest = json.load(file)
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    for i, job in enumerate(manifest['jobs']):
+        if job.get('type') not in GENERATORS:
+            raise ValueError(f"Job {i} has an unknown type {job.get('type')!r}, expected one of {', '.join(GENERATORS)}")
+    return manifest
+
+def job_name (i, job):
+    return job.get('name', f"{i}:{job['type']}")
+
+def job_inputs (job):
+    paths = []
+    for key in INPUTS.get(job['type'], ()):
+        path = job[key]
+        paths += frame_paths(path) if any(c in path for c in '*?[') else [path]
+    return paths
+
+def run_job (job):
+    ## returns (seconds, bytes written, paths written)
+    module, function = GENERATORS[job['type']]
+    create = getattr(importlib.import_module(module), function)
+    args = {k: v for k, v in job.items() if k not in ('type', 'name')}
+    start = time.perf_counter()
+    with record_outputs() as outputs:
+        size = create(**args)
+    return time.perf_counter() - start, size or 0, outputs
+
+def warm_cache (in_name, scale):
+    load_cached(in_name, scale)
+
+def run_batch (manifest, workers=None, force=False):
+    ## returns {job name: (seconds, bytes, paths)}, jobs that failed have their exception instead
+    ## and jobs that were skipped have None
+    jobs = manifest['jobs']
+    workers = workers or manifest.get('workers') or os.cpu_count()
+    state_path = manifest.get('state', STATE_FILE)
+    state = load_state(state_path)
+    code = code_hash(state)
+    results = {}
+
+    pending = []
+    for i, job in enumerate(jobs):
+        if not force and is_current(state, job, job_inputs(job), code):
+            results[job_name(i, job)] = None
+            print(f"{job_name(i, job)}: unchanged")
+        else:
+            pending.append((i, job))
+
+    if pending:
+        with ProcessPoolExecutor(min(workers, len(pending))) as pool:
+            sources = {(job['in_name'], job['scale']) for i, job in pending if job['type'] in ('obj', 'obj_lod') and job.get('cache', True)}
+            ## a source that fails to load fails its jobs below, where it gets reported
+            wait([pool.submit(warm_cache, *source) for source in sources])
+
+            futures = {pool.submit(run_job, job): (i, job) for i, job in pending}
+            for future in as_completed(futures):
+                i, job = futures[future]
+                name = job_name(i, job)
+                try:
+                    results[name] = future.result()
+                    record(state, job, job_inputs(job), results[name][2], code)
+                    print(f"{name}: {results[name][0]:.2f}s, {results[name][1]} bytes")
+                except Exception as e:
+                    results[name] = e
+                    print(f"{name}: failed, {e!r}")
+
+    prune(state, jobs)
+    save_state(state, state_path)
+    return results
+
+def main ():
+    parser = argparse.ArgumentParser(description="Run the generator jobs in a .json or .toml manifest.")
+    parser.add_argument('manifest')
+    parser.add_argument('workers', nargs='?', type=int, help="worker processes, by default the manifest's workers or one per CPU")
+    parser.add_argument('--force', action='store_true', help="rebuild every job, even unchanged ones")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_batch(load_manifest(args.manifest), args.workers, args.force)
+    done = [r for r in results.values() if isinstance(r, tuple)]
+    skipped = sum(r is None for r in results.values())
+    print(f"\n\nRan {len(done)} of {len(results)} jobs ({skipped} unchanged) in {time.perf_counter() - start:.2f}s, wrote {sum(r[1] for r in done)} bytes.")
+
+if __name__ == '__main__':
+    main()
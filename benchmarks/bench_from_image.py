@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_sampling import sample_image
+
+## times pulling pixels out of an image the old way (getpixel per pixel, as from_image did)
+## against image_sampling.sample_image, and checks both give the same colors in the same order
+
+
+def per_pixel (img, dx, dy, density):
+    width = int(dx / density)
+    height = int(dy / density)
+    scaled_im = Image.open(img).convert('RGB').resize((width, height))
+    colors = []
+    for x in range(width):
+        for y in range(height):
+            r, g, b = scaled_im.getpixel((x, y))
+            colors.append(((x * density, y * density), (r / 255, g / 255, b / 255)))
+    return colors
+
+def best_of (repeat, fn, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def main ():
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as folder:
+        img = os.path.join(folder, 'bench.png')
+        Image.fromarray(rng.integers(0, 256, (1024, 1024, 3), dtype=np.uint8)).save(img)
+
+        for side in (64, 256, 1024):
+            old_time, colors = best_of(3, per_pixel, img, side, side, 1)
+            new_time, cloud = best_of(3, sample_image, img, side, side, 1)
+            same = np.allclose(np.array([c[1] for c in colors]), cloud.float_colors())
+            print(f"{side}x{side}: getpixel loop {old_time * 1000:.1f} ms, numpy {new_time * 1000:.1f} ms ({old_time / new_time:.0f}x), same output: {same}")
+
+if __name__ == '__main__':
+    main()
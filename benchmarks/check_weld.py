@@ -0,0 +1,59 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sampling import face_arrays, face_edges, sample_edges, unique_edges
+from from_obj import sample_model, solve_density
+from spikes import spike_points
+from spatial import WELD_FRACTION, weld_points
+
+## checks the default weld only merges near-coincident particles: edge samples spaced exactly the
+## density apart (including the density the budget solver picks) all survive, apart from the copies
+## of a corner that every edge starting there samples, and doubled points merge
+
+
+def cube (side):
+    vertexes = np.array([(x, y, z) for x in (0, side) for y in (0, side) for z in (0, side)], dtype=np.float64)
+    faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    return (vertexes,) + face_arrays(faces)
+
+def largest_gap (points, a, b):
+    ## biggest distance between neighbouring samples on the segment from a to b, ends included
+    direction = (b - a) / np.linalg.norm(b - a)
+    offsets = points - a
+    along = offsets @ direction
+    on_edge = np.linalg.norm(offsets - np.outer(along, direction), axis=1) < 1e-6
+    return np.diff(np.sort(np.concatenate(([0, np.linalg.norm(b - a)], along[on_edge])))).max()
+
+def check (name, ok, detail):
+    print(f"{name}: {'ok' if ok else 'FAILED'} ({detail})")
+    return ok
+
+def main ():
+    results = []
+    vertexes, indices, offsets = cube(10)
+    edges = unique_edges(face_edges(indices, offsets))[0]
+    for density in (0.1, 0.05, 0.3, solve_density(vertexes, indices, offsets, 1000)):
+        sampled = sample_edges(vertexes, edges, density)
+        distinct = len(np.unique(sampled.round(9), axis=0))
+        points = sample_model(vertexes, indices, offsets, density)[0]
+        gap = largest_gap(points.positions, vertexes[0], vertexes[4])
+        spacing = largest_gap(sampled, vertexes[0], vertexes[4])
+        results.append(check(f"cube edges at {density:.6g}", len(points) == distinct and np.isclose(gap, spacing, rtol=1e-4), f"kept {len(points)} of {distinct} distinct samples, largest gap on an edge {gap:.4f}"))
+
+    for width, height, density in ((2, 2, 0.1), (4, 30, 0.05)):
+        positions = spike_points(width, height, density, (1, 0, 0), (0, 0, 1))[0]
+        kept = len(weld_points(positions, density * WELD_FRACTION))
+        results.append(check(f"{width}x{height} spike at {density}", kept > 0.9 * len(positions), f"kept {kept} of {len(positions)}"))
+
+    points = sample_model(vertexes, indices, offsets, 0.1)[0].positions
+    doubled = np.concatenate((points, points + 1e-4))
+    kept = len(weld_points(doubled, 0.1 * WELD_FRACTION))
+    results.append(check("doubled points", kept == len(points), f"kept {kept} of {len(doubled)}"))
+
+    if not all(results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import glob
+import json
+import hashlib
+from mesh_cache import file_hash
+
+## remembers what each batch job was built from and what it wrote, so unchanged jobs can be skipped.
+## a job is up to date when its parameters, the hashes of its input files, the hash of this folder's
+## code and the hashes of the files it wrote all match its last build. each file's hash is kept with
+## its size and modification time and only worked out again when those change, so checking a job
+## that didn't change costs a stat per file
+
+STATE_FILE = '.build_state.json'
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_state (path=STATE_FILE):
+    if not os.path.exists(path):
+        return {'files': {}, 'jobs': {}}
+    with open(path) as file:
+        return json.load(file)
+
+def save_state (state, path=STATE_FILE):
+    with open(path + '.tmp', 'w') as file:
+        json.dump(state, file, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def fingerprint (state, path):
+    ## the file's hash, or None if it doesn't exist
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    known = state['files'].get(path)
+    if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return known[2]
+    digest = file_hash(path)
+    state['files'][path] = [stat.st_size, stat.st_mtime_ns, digest]
+    return digest
+
+def code_hash (state):
+    paths = sorted(glob.glob(os.path.join(CODE_DIR, '*.py')))
+    return hashlib.sha256(' '.join(fingerprint(state, path) for path in paths).encode()).hexdigest()
+
+def job_key (job):
+    return json.dumps({k: v for k, v in job.items() if k != 'name'}, sort_keys=True)
+
+def is_current (state, job, inputs, code):
+    entry = state['jobs'].get(job_key(job))
+    if entry is None or entry['code'] != code:
+        return False
+    if entry['inputs'] != {path: fingerprint(state, path) for path in inputs}:
+        return False
+    return all(fingerprint(state, path) == digest for path, digest in entry['outputs'].items())
+
+def record (state, job, inputs, outputs, code):
+    state['jobs'][job_key(job)] = {
+        'code': code,
+        'inputs': {path: fingerprint(state, path) for path in inputs},
+        'outputs': {path: fingerprint(state, path) for path in outputs},
+    }
+
+def prune (state, jobs):
+    ## forgets jobs that aren't in jobs any more, and files no remaining job or code file uses
+    keys = {job_key(job) for job in jobs}
+    state['jobs'] = {key: entry for key, entry in state['jobs'].items() if key in keys}
+    used = {path for entry in state['jobs'].values() for part in ('inputs', 'outputs') for path in entry[part]}
+    used.update(glob.glob(os.path.join(CODE_DIR, '*.py')))
+    state['files'] = {path: known for path, known in state['files'].items() if path in used}
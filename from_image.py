@@ -1,4 +1,9 @@
+import os
+import numpy as np
 from PIL import Image
+from ticks import write_sliced
+from serializer import PRECISION, open_output, row_format, write_rows
+from image_sampling import frame_paths, grid_size, iter_frames, pixel_cloud, pixel_mask, sample_image
 
 def rgb_pixel (img, x, y):
     #im = Image.open(img)
@@ -6,37 +11,121 @@ def rgb_pixel (img, x, y):
     a = (r / 255, g / 255, b / 255)
     return a
 
-def create_mcfunction (img, out_name, dx, dy, density, size):
-    desired_width = int(dx / density)
-    desired_height = int(dy / density)
+def create_mcfunction (img, out_name, dx, dy, density, size, chunk_size=None, function_path=None, scheduled=True, precision=PRECISION, alpha_threshold=None, key_color=None, key_tolerance=0, adaptive_threshold=None, max_leaf=8):
+    cloud = sample_image(img, dx, dy, density, alpha_threshold, key_color, key_tolerance, adaptive_threshold, max_leaf)
+    print(f"Created {len(cloud)} particle commands.")
 
-    im = Image.open(img).convert('RGB')
-    scaled_im = im.resize((desired_width, desired_height))
+    header = "## File created with RiceRocket's Obj particle converter\n\n\n"
+    if cloud.sizes is None:
+        fmt = row_format(['particle dust ', ' ', ' ', f' {size} ~', ' ~ ~', ' 0 0 0 0 1 force\n'], precision)
+        rows = np.column_stack((cloud.float_colors(), cloud.positions[:, 0], cloud.positions[:, 2]))
+    else:
+        ## quadtree leaves are bigger than one pixel, their particles grow with them
+        fmt = row_format(['particle dust ', ' ', ' ', ' ', ' ~', ' ~ ~', ' 0 0 0 0 1 force\n'], precision)
+        rows = np.column_stack((cloud.float_colors(), cloud.sizes * size, cloud.positions[:, 0], cloud.positions[:, 2]))
+    if chunk_size:
+        return write_sliced(out_name, function_path, header, fmt, rows, chunk_size, scheduled)
+    return write_rows(out_name + '.mcfunction', header, fmt, rows)
 
-    colors = []
-    for x in range(desired_width):
-        for y in range(desired_height):
-            color = rgb_pixel(scaled_im, x, y)
-            color_coords = ((x * density, y * density), (color))
-            colors.append(color_coords)
+def create_sequence_mcfunctions (source, out_name, function_path, dx, dy, density, size, ticks_per_frame=1, keyframe_interval=None, delta_tolerance=0, precision=PRECISION, alpha_threshold=None, key_color=None, key_tolerance=0):
+    ## one function per frame (out_name_frame0, out_name_frame1, ...) of a GIF or a pattern of numbered images,
+    ## plus out_name.mcfunction, a player to run every tick, and out_name_setup.mcfunction which adds the
+    ## out_name.frame objective and rewinds to the first frame. GIF frames keep their own durations.
+    ## with a keyframe_interval only every keyframe_interval-th frame is written whole, the frames between
+    ## hold just the pixels that differ from the last keyframe by more than delta_tolerance (0 - 255),
+    ## which is only right for particles that last until the next keyframe
+    name = os.path.basename(out_name)
+    objective = f'{name}.frame'
+    header = "## File created with RiceRocket's Obj particle converter\n\n\n"
+    fmt = row_format(['particle dust ', ' ', ' ', f' {size} ~', ' ~ ~', ' 0 0 0 0 1 force\n'], precision)
+    width, height = grid_size(dx, dy, density)
 
-    out_name = out_name + '.mcfunction'
-    with open(out_name, 'w') as file:
-        file.write("## File created with RiceRocket's Obj particle converter\n\n\n")
-        for i in colors:
-            file.write(f'particle dust {i[1][0]} {i[1][1]} {i[1][2]} {size} ~{i[0][0]} ~ ~{i[0][1]} 0 0 0 0 1 force\n')
+    written = 0
+    particles = 0
+    tick = 0
+    keyframe = None
+    player = []
+    frames = iter_frames(source, width, height, 'RGB' if alpha_threshold is None else 'RGBA')
+    for i, (pixels, duration) in enumerate(frames):
+        keep = pixel_mask(pixels, alpha_threshold, key_color, key_tolerance)
+        if keyframe_interval and i % keyframe_interval:
+            diff = np.abs(pixels.astype(np.int16) - keyframe)
+            keep &= (diff.max(axis=2) > delta_tolerance).T.reshape(-1)
+        else:
+            keyframe = pixels
+        cloud = pixel_cloud(pixels, density).filter(keep)
+        particles += len(cloud)
 
-input_image = str(input("Input image name (include file extension): "))
-input_out = str(input("Output function (exclude .mcfunction file extension): "))
-input_width = float(input("Width of image (in blocks): "))
+        rows = np.column_stack((cloud.float_colors(), cloud.positions[:, 0], cloud.positions[:, 2]))
+        written += write_rows(f'{out_name}_frame{i}.mcfunction', header, fmt, rows)
 
-a, b, x, y = Image.open(input_image).getbbox()
-aspect = x / y
-rec_height = input_width / aspect
+        ticks = ticks_per_frame if duration is None else max(1, round(duration / 50))
+        matches = f'{tick}..{tick + ticks - 1}' if ticks > 1 else f'{tick}'
+        player.append(f'execute if score frame {objective} matches {matches} run function {function_path}/{name}_frame{i}\n')
+        tick += ticks
 
-input_height = float(input(f"Height of image (in blocks). To maintain aspect ratio, use {rec_height}: "))
-input_density = float(input(f"Density of particles (closeness in blocks): "))
-input_size = float(input("Size of particles: "))
+    player.append(f'\nscoreboard players add frame {objective} 1\nexecute if score frame {objective} matches {tick}.. run scoreboard players set frame {objective} 0\n')
+    with open_output(out_name + '.mcfunction') as out:
+        out.write(header)
+        out.writelines(player)
+    with open_output(out_name + '_setup.mcfunction') as out:
+        out.write(header)
+        out.write(f'scoreboard objectives add {objective} dummy\nscoreboard players set frame {objective} 0\n')
+    written += os.path.getsize(out_name + '.mcfunction') + os.path.getsize(out_name + '_setup.mcfunction')
 
+    print(f"Created {len(player) - 1} frames with {particles} particle commands, looping every {tick} ticks.")
+    return written
 
-create_mcfunction (input_image, input_out, input_width, input_height, input_density, input_size)
+def main ():
+    input_image = str(input("Input image name (include file extension). For numbered frames, use a pattern like frames/*.png: "))
+    input_out = str(input("Output function (exclude .mcfunction file extension): "))
+    input_width = float(input("Width of image (in blocks): "))
+
+    input_frames = frame_paths(input_image) if any(c in input_image for c in '*?[') else [input_image]
+    first_frame = Image.open(input_frames[0])
+    input_sequence = len(input_frames) > 1 or getattr(first_frame, 'n_frames', 1) > 1
+    a, b, x, y = first_frame.getbbox()
+    aspect = x / y
+    rec_height = input_width / aspect
+
+    input_height = float(input(f"Height of image (in blocks). To maintain aspect ratio, use {rec_height}: "))
+    input_density = float(input(f"Density of particles (closeness in blocks): "))
+    input_size = float(input("Size of particles: "))
+    input_alpha = str(input("Skip pixels more transparent than this alpha (0 - 255). Leave blank to keep every pixel: ")).strip()
+    input_alpha = int(input_alpha) if input_alpha else None
+    input_key = str(input("Skip pixels of this color (R,G,B from 0 - 255). Leave blank to skip none: ")).strip()
+    input_key_color = None
+    input_key_tolerance = 0
+    if input_key:
+        input_key_color = tuple(int(c) for c in input_key.split(','))
+        input_key_tolerance = int(input("How far off that color a pixel can be and still be skipped (0 - 255): ") or 0)
+    if input_sequence:
+        input_function_path = str(input("Path of the output functions (Ex. example:folder_1/folder_2): "))
+        input_ticks = int(input("Ticks to show each frame for, when the frames don't say: ") or 1)
+        input_keyframes = str(input("Write only changed pixels, with a full keyframe every how many frames? Leave blank to write every frame whole: ")).strip()
+        input_keyframes = int(input_keyframes) if input_keyframes else None
+        input_delta_tolerance = 0
+        if input_keyframes:
+            input_delta_tolerance = int(input("How far a pixel can change (0 - 255) and still count as unchanged: ") or 0)
+
+        input_bytes = create_sequence_mcfunctions(input_image, input_out, input_function_path, input_width, input_height, input_density, input_size, input_ticks, input_keyframes, input_delta_tolerance, alpha_threshold=input_alpha, key_color=input_key_color, key_tolerance=input_key_tolerance)
+        print(f"Wrote {input_bytes} bytes.")
+    else:
+        input_adaptive = str(input("Merge flat areas into bigger particles while their colors are within this deviation (0 - 255). Leave blank for one particle per pixel: ")).strip()
+        input_adaptive = float(input_adaptive) if input_adaptive else None
+        input_max_leaf = 8
+        if input_adaptive is not None:
+            input_max_leaf = int(input("Widest merged area, in pixels (a power of two, Ex. 8): ") or 8)
+        input_chunk_size = str(input("Split into functions of at most how many commands? Leave blank to write one function: ")).strip()
+        input_chunk_size = int(input_chunk_size) if input_chunk_size else None
+        input_function_path = None
+        input_scheduled = True
+        if input_chunk_size:
+            input_function_path = str(input("Path of the output functions (Ex. example:folder_1/folder_2): "))
+            input_scheduled = str(input("Run one part per tick instead of all at once? (Y/N): ")).strip().lower() != 'n'
+
+        input_bytes = create_mcfunction (input_image, input_out, input_width, input_height, input_density, input_size, input_chunk_size, input_function_path, input_scheduled, alpha_threshold=input_alpha, key_color=input_key_color, key_tolerance=input_key_tolerance, adaptive_threshold=input_adaptive, max_leaf=input_max_leaf)
+        print(f"Wrote {input_bytes} bytes.")
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,15 @@
+import os
 import math
 from glm import vec3
 import glm
+import numpy as np
+from sampling import edge_lengths, face_arrays, face_edges, sample_edges, sample_edges_parallel, sample_surface, solve_edge_density, solve_surface_spacing, unique_edges
+from obj_loader import load_obj
+from mesh_cache import load_cached
+from spatial import WELD_FRACTION, weld_points
+from ticks import write_sliced
+from serializer import PRECISION, open_output, row_format, write_rows
+from pointcloud import PointCloud
 
 def parse_obj (file, scale):
     vertexes = []
@@ -51,56 +60,132 @@ def interpolate (a, b, x):
     return face_points
 
 
-def draw (vertexes, faces, density):
-    points = []
-    #for v in vertexes:
-    #    points.append(v)
-    for f in faces:
-        for i in range(len(f)):
-            i0 = f[(i - 1)%len(f)]
-            i1 = f[i]
-            v0 = vertexes[i0]
-            v1 = vertexes[i1]
-            points += interpolate(v0, v1, density)
-    return points
-
-def create_mcfunction (in_name, out_name, particle, density, scale):
-    with open(in_name, 'r') as file:
-        vertexes, faces, min_v, max_v = parse_obj(file, scale)
-        points = draw(vertexes, faces, density)
-        
-        #print(min_v)
-        #print(max_v)
-        #print(len(points))
-        #print(faces)
-    with open(out_name, 'w') as out:
+def draw (vertexes, faces, density, dedupe=False):
+    ## returns an (N, 3) array of points, in the same order the per-face loop produced them
+    vertexes = np.array(vertexes, dtype=np.float64).reshape(-1, 3)
+    edges = face_edges(*face_arrays(faces))
+    if dedupe:
+        edges = unique_edges(edges)[0]
+    return sample_edges(vertexes, edges, density)
+
+def solve_density (vertexes, indices, offsets, budget, mode='edges'):
+    ## density that keeps the model at or under budget particles, without sampling it
+    if mode == 'surface':
+        return solve_surface_spacing(vertexes, indices, offsets, budget)
+    edges = unique_edges(face_edges(indices, offsets))[0]
+    return solve_edge_density(edge_lengths(vertexes, edges), budget)
+
+def sample_model (vertexes, indices, offsets, density, mode='edges', weld=None, workers=1, budget=None):
+    if mode == 'surface':
+        points = sample_surface(vertexes, indices, offsets, density, count=budget)
+        removed = 0
+    else:
+        edges, removed = unique_edges(face_edges(indices, offsets))
+        points = sample_edges_parallel(vertexes, edges, density, workers)
+
+    ## merge particles closer than the weld distance, by default a fraction of the particle spacing
+    sampled = len(points)
+    points = points[weld_points(points, density * WELD_FRACTION if weld is None else weld)]
+    return PointCloud(points), removed, sampled - len(points)
+
+def write_mcfunction (out_name, points, particle, chunk_size=None, function_path=None, scheduled=True, precision=PRECISION):
+    ## points is a PointCloud. with a chunk_size, the commands are split into parts run by
+    ## out_name (see ticks.write_sliced). returns the bytes written
+    header = "## File created with RiceRocket's Obj particle converter\n\n\n"
+    fmt = row_format([f'particle {particle} ~', ' ~', ' ~', ' 0 0 0 0 1 force @a\n'], precision)
+    if chunk_size:
+        return write_sliced(out_name[:-len('.mcfunction')], function_path, header, fmt, points.positions, chunk_size, scheduled)
+    return write_rows(out_name, header, fmt, points.positions)
+
+def create_mcfunction (in_name, out_name, particle, density, scale, mode='edges', weld=None, cache=True, workers=1, budget=None, chunk_size=None, function_path=None, scheduled=True, precision=PRECISION):
+    ## with a budget (a maximum particle count), density is worked out from it and can be None
+    vertexes, indices, offsets, min_v, max_v = (load_cached if cache else load_obj)(in_name, scale)
+    if budget:
+        density = solve_density(vertexes, indices, offsets, budget, mode)
+        print(f"Using a density of {density} to stay within {budget} particles.")
+    points, removed, merged = sample_model(vertexes, indices, offsets, density, mode, weld, workers, budget)
+    size = write_mcfunction(out_name, points, particle, chunk_size, function_path, scheduled, precision)
+
+    print(f"Created {len(points)} particle commands ({size} bytes).")
+    if mode != 'surface':
+        print(f"Skipped {removed} edges shared between faces.")
+    print(f"Merged {merged} overlapping particles.")
+    return size
+
+def create_lod_mcfunctions (in_name, out_name, function_path, particle, densities, distances, scale, mode='edges', weld=None, cache=True, workers=1):
+    ## one function per density (out_name_lod0, out_name_lod1, ...) from a single parse, plus
+    ## out_name.mcfunction which runs the level matching the nearest player. level i is used
+    ## while a player is within distances[i] blocks, nothing is drawn past the last distance.
+    ## returns the bytes written
+    vertexes, indices, offsets, min_v, max_v = (load_cached if cache else load_obj)(in_name, scale)
+    name = os.path.basename(out_name)
+
+    written = 0
+    dispatch = []
+    for i, (density, distance) in enumerate(zip(densities, distances)):
+        points, removed, merged = sample_model(vertexes, indices, offsets, density, mode, weld, workers)
+        size = write_mcfunction(f'{out_name}_lod{i}.mcfunction', points, particle)
+        written += size
+        print(f"Level {i}: created {len(points)} particle commands ({size} bytes) at a density of {density}, shown within {distance} blocks.")
+
+        closer = f'unless entity @p[distance=..{distances[i - 1]}] ' if i else ''
+        dispatch.append(f'execute {closer}if entity @p[distance=..{distance}] run function {function_path}/{name}_lod{i}\n')
+
+    with open_output(out_name + '.mcfunction') as out:
         out.write("## File created with RiceRocket's Obj particle converter\n\n\n")
-        for i in points:
-            out.write(f"particle {particle} ~{i[0]} ~{i[1]} ~{i[2]} 0 0 0 0 1 force @a\n")
-    print(f"Created {len(points)} particle commands.")
-
-## main
-
-input_in_file = str(input("Input .obj filename (ignoring file extension): ")) + '.obj'
-input_out_file = str(input("Output .mcfunction filename (ignoring file extension): ")) + '.mcfunction'
-input_particle_type = str(input("Particle to use: "))
-
-if input_particle_type == 'dust':
-    input_dust = str(input("Color of dust particle (RGB): "))
-    dust_array = input_dust.split(',')
-    input_dust_r = float(dust_array[0])
-    input_dust_g = float(dust_array[1])
-    input_dust_b = float(dust_array[2])
-    input_dust_size = input("Size of dust particle: ")
-    input_particle_type = f"dust {input_dust_r} {input_dust_g} {input_dust_b} {input_dust_size}"
-
-input_scale = int(input("Scale of model ingame (in blocks): "))
-input_density = float(input(f"Distance between particles (in blocks), recommended number to use is {input_scale / 50}: "))
-
-input("Press enter to continue")
-
-create_mcfunction (input_in_file, input_out_file, input_particle_type, input_density, input_scale)
-
-print(f"Created file '{input_out_file}'")
-#create_mcfunction ('t_34_obj.obj', 'particles.mcfunction', 'flame', 0.1, 5)
-#print(interpolate(vec3([1, 0, 1]), vec3([0, 0, 0]), 10))
\ No newline at end of file
+        out.writelines(dispatch)
+    return written + os.path.getsize(out_name + '.mcfunction')
+
+def main ():
+    input_in_file = str(input("Input .obj filename (ignoring file extension): ")) + '.obj'
+    input_out_file = str(input("Output .mcfunction filename (ignoring file extension): ")) + '.mcfunction'
+    input_particle_type = str(input("Particle to use: "))
+
+    if input_particle_type == 'dust':
+        input_dust = str(input("Color of dust particle (RGB): "))
+        dust_array = input_dust.split(',')
+        input_dust_r = float(dust_array[0])
+        input_dust_g = float(dust_array[1])
+        input_dust_b = float(dust_array[2])
+        input_dust_size = input("Size of dust particle: ")
+        input_particle_type = f"dust {input_dust_r} {input_dust_g} {input_dust_b} {input_dust_size}"
+
+    input_scale = int(input("Scale of model ingame (in blocks): "))
+    input_density = str(input(f"Distance between particles (in blocks), recommended number to use is {input_scale / 50}. Leave blank to give a particle limit instead: ")).strip()
+    input_budget = None
+    if input_density == '':
+        input_density = None
+        input_budget = int(input("Maximum number of particles: "))
+    else:
+        input_density = float(input_density)
+    input_mode = str(input("Draw the edges or fill the surface of the model? (edges/surface): ")).strip().lower() or 'edges'
+    input_lods = 1
+    if input_budget is None:
+        input_lods = int(input("Levels of detail, each one twice as sparse as the last (1 for a single function): ") or 1)
+
+    if input_lods > 1:
+        input_path = str(input("Path of the output functions (Ex. example:folder_1/folder_2): "))
+        input_distances = [float(d) for d in str(input(f"Distance each of the {input_lods} levels is shown within, nearest first (Ex. 16,32,64): ")).split(',')]
+    else:
+        input_chunk_size = str(input("Split into functions of at most how many commands? Leave blank to write one function: ")).strip()
+        input_chunk_size = int(input_chunk_size) if input_chunk_size else None
+        input_function_path = None
+        input_scheduled = True
+        if input_chunk_size:
+            input_function_path = str(input("Path of the output functions (Ex. example:folder_1/folder_2): "))
+            input_scheduled = str(input("Run one part per tick instead of all at once? (Y/N): ")).strip().lower() != 'n'
+
+    input("Press enter to continue")
+
+    if input_lods > 1:
+        input_out_name = input_out_file[:-len('.mcfunction')]
+        create_lod_mcfunctions (input_in_file, input_out_name, input_path, input_particle_type, [input_density * 2 ** i for i in range(input_lods)], input_distances, input_scale, input_mode)
+        print(f"Created {input_lods} level files and the file '{input_out_file}'")
+    else:
+        create_mcfunction (input_in_file, input_out_file, input_particle_type, input_density, input_scale, input_mode, budget=input_budget, chunk_size=input_chunk_size, function_path=input_function_path, scheduled=input_scheduled)
+        print(f"Created file '{input_out_file}'")
+    #create_mcfunction ('t_34_obj.obj', 'particles.mcfunction', 'flame', 0.1, 5)
+    #print(interpolate(vec3([1, 0, 1]), vec3([0, 0, 0]), 10))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import re
+import glob
+import math
+import numpy as np
+from PIL import Image, ImageSequence
+from pointcloud import PointCloud
+
+## turns an image into a PointCloud with one particle per pixel of the resized image,
+## laid flat on x / z, in the same column by column order from_image always used
+
+TILE_ROWS = 256
+TILE_PIXELS = 1 << 24
+REDUCING_GAP = 3
+## modes Image.reduce averages properly. it refuses 1-bit, 16-bit and palette images and would average
+## the palette indexes of PA, those are resized straight from the source instead
+REDUCE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'YCbCr', 'I', 'F')
+
+
+def grid_size (dx, dy, density):
+    return int(dx / density), int(dy / density)
+
+def resize_pixels (im, width, height, mode='RGB', tile_rows=TILE_ROWS):
+    ## (height, width, 3) uint8, or (height, width, 4) with mode 'RGBA'. JPEGs are decoded at a
+    ## fraction of their size and images far bigger than the output are box-reduced before converting.
+    ## whatever is left is converted and resized in one go if it's at most TILE_PIXELS, the same as
+    ## always. bigger images are done tile_rows output rows at a time (cut out with enough rows around
+    ## them for the filter) so there's never a converted copy of the whole image, but each tile's
+    ## resize weights are rounded on their own, so their pixels can be off by a few levels
+    im.draft(mode, (width, height))
+    factor = int(min(im.width / width, im.height / height) / REDUCING_GAP)
+    if factor > 1 and im.mode in REDUCE_MODES:
+        im = im.reduce(factor)
+    if im.width * im.height <= TILE_PIXELS:
+        return np.asarray(im.convert(mode).resize((width, height)))
+
+    scale = im.height / height
+    margin = math.ceil(2 * max(scale, 1)) + 1
+    tiles = []
+    for row in range(0, height, tile_rows):
+        rows = min(tile_rows, height - row)
+        y0 = row * scale
+        y1 = (row + rows) * scale
+        top = max(0, math.floor(y0) - margin)
+        bottom = min(im.height, math.ceil(y1) + margin)
+        band = im.crop((0, top, im.width, bottom)).convert(mode)
+        tiles.append(np.asarray(band.resize((width, rows), box=(0, y0 - top, im.width, y1 - top))))
+    return np.concatenate(tiles)
+
+def load_pixels (img, width, height, mode='RGB', tile_rows=TILE_ROWS):
+    with Image.open(img) as im:
+        return resize_pixels(im, width, height, mode, tile_rows)
+
+def frame_paths (pattern):
+    ## the files matching a glob pattern like frames/*.png, in frame number order (frame_2 before frame_10)
+    key = lambda path: [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', path)]
+    return sorted(glob.glob(pattern), key=key)
+
+def iter_frames (source, width, height, mode='RGB'):
+    ## yields (pixels, duration in ms or None) for every frame of an animated image (GIF, APNG, WebP)
+    ## or of the numbered images matching a glob pattern, decoding one frame at a time
+    if any(c in source for c in '*?['):
+        for path in frame_paths(source):
+            yield load_pixels(path, width, height, mode), None
+        return
+    with Image.open(source) as im:
+        for frame in ImageSequence.Iterator(im):
+            yield resize_pixels(frame, width, height, mode), frame.info.get('duration')
+
+def pixel_mask (pixels, alpha_threshold=None, key_color=None, key_tolerance=0):
+    ## which pixels to keep, in pixel_cloud's order. drops pixels with alpha under
+    ## alpha_threshold (needs RGBA pixels) and pixels within key_tolerance of key_color on every channel
+    keep = np.ones(pixels.shape[:2], dtype=bool)
+    if alpha_threshold is not None and pixels.shape[2] == 4:
+        keep &= pixels[..., 3] >= alpha_threshold
+    if key_color is not None:
+        diff = np.abs(pixels[..., :3].astype(np.int16) - np.asarray(key_color, dtype=np.int16))
+        keep &= diff.max(axis=2) > key_tolerance
+    return keep.T.reshape(-1)
+
+def pixel_cloud (pixels, density, x0=0):
+    height, width = pixels.shape[:2]
+    colors = pixels[..., :3].transpose(1, 0, 2).reshape(-1, 3)
+    xs = np.repeat(np.arange(x0, x0 + width) * density, height)
+    zs = np.tile(np.arange(height) * density, width)
+    return PointCloud(np.column_stack((xs, np.zeros_like(xs), zs)), colors)
+
+def _pyramid (pixels, levels):
+    ## per-level sums of every channel, of their squares, and of how many real pixels each block holds.
+    ## the image is padded out to whole blocks, padding counts as no pixels
+    block = 1 << levels
+    height, width = pixels.shape[:2]
+    padded_h = -(-height // block) * block
+    padded_w = -(-width // block) * block
+    values = np.zeros((padded_h, padded_w, pixels.shape[2]))
+    values[:height, :width] = pixels
+    count = np.zeros((padded_h, padded_w))
+    count[:height, :width] = 1
+
+    pyramid = [(values, values * values, count)]
+    for _ in range(levels):
+        pyramid.append(tuple(a[0::2, 0::2] + a[1::2, 0::2] + a[0::2, 1::2] + a[1::2, 1::2] for a in pyramid[-1]))
+    return pyramid
+
+def quadtree_leaves (pixels, threshold, max_leaf=8):
+    ## splits the image into square blocks of at most max_leaf pixels (a power of two), splitting
+    ## a block again while the standard deviation of its channels (0 - 255) is over threshold.
+    ## returns each leaf's corner x, y, its width and its mean pixel, sorted column by column
+    levels = max(int(max_leaf).bit_length() - 1, 0)
+    pyramid = _pyramid(pixels, levels)
+
+    count = pyramid[levels][2]
+    by, bx = np.nonzero(count)
+    found = []
+    for level in range(levels, -1, -1):
+        sums, squares, count = pyramid[level]
+        n = count[by, bx][:, None]
+        mean = sums[by, bx] / n
+        variance = (squares[by, bx] / n - mean * mean).mean(axis=1)
+        full = n[:, 0] == (1 << level) ** 2
+        leaf = (full & (variance <= threshold * threshold)) | (level == 0)
+        found.append((bx[leaf] << level, by[leaf] << level, np.full(leaf.sum(), 1 << level), mean[leaf]))
+
+        ## split the rest into the children that hold any pixels
+        bx = (2 * bx[~leaf, None] + np.array([0, 1, 0, 1])).reshape(-1)
+        by = (2 * by[~leaf, None] + np.array([0, 0, 1, 1])).reshape(-1)
+        if level:
+            inside = pyramid[level - 1][2][by, bx] > 0
+            bx = bx[inside]
+            by = by[inside]
+
+    x, y, width, mean = (np.concatenate(a) for a in zip(*found))
+    order = np.lexsort((y, x))
+    return x[order], y[order], width[order], np.rint(mean[order]).astype(np.uint8)
+
+def quadtree_cloud (pixels, density, threshold, max_leaf=8):
+    ## one particle in the middle of every leaf, sizes hold the leaf width in pixels.
+    ## also returns the leaves' mean pixels as a (1, N, channels) image for pixel_mask
+    x, y, width, mean = quadtree_leaves(pixels, threshold, max_leaf)
+    xs = (x + (width - 1) / 2) * density
+    zs = (y + (width - 1) / 2) * density
+    cloud = PointCloud(np.column_stack((xs, np.zeros_like(xs), zs)), mean[:, :3], width)
+    return cloud, mean[None]
+
+def sample_image (img, dx, dy, density, alpha_threshold=None, key_color=None, key_tolerance=0, adaptive_threshold=None, max_leaf=8):
+    ## alpha_threshold is 0 - 255, key_color is an (r, g, b) of 0 - 255. see pixel_mask.
+    ## with an adaptive_threshold, flat areas are merged into bigger particles (see quadtree_leaves)
+    width, height = grid_size(dx, dy, density)
+    pixels = load_pixels(img, width, height, 'RGB' if alpha_threshold is None else 'RGBA')
+    if adaptive_threshold is None:
+        cloud = pixel_cloud(pixels, density)
+    else:
+        cloud, pixels = quadtree_cloud(pixels, density, adaptive_threshold, max_leaf)
+    if alpha_threshold is None and key_color is None:
+        return cloud
+    return cloud.filter(pixel_mask(pixels, alpha_threshold, key_color, key_tolerance))
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import numpy as np
+from obj_loader import load_obj
+
+## parsed and normalized meshes are kept as .npz files named after a hash of the
+## .obj's bytes and the scale, so changing the particle or density skips parsing.
+## the least recently used files are deleted once the folder grows past CACHE_SIZE
+
+CACHE_DIR = '.mesh_cache'
+CACHE_SIZE = 8 << 30
+
+_FIELDS = ('vertexes', 'indices', 'offsets', 'min_v', 'max_v')
+
+
+def file_hash (path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 24), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def cache_key (path, scale):
+    return hashlib.sha256(f'{file_hash(path)} {float(scale)!r}'.encode()).hexdigest()
+
+def evict (cache_dir=CACHE_DIR, max_size=CACHE_SIZE, keep=None):
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.npz'):
+            continue
+        entry = os.path.join(cache_dir, name)
+        stat = os.stat(entry)
+        entries.append((stat.st_mtime, stat.st_size, entry))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_size:
+            break
+        if entry == keep:
+            continue
+        os.remove(entry)
+        total -= size
+
+def load_cached (path, scale, cache_dir=CACHE_DIR, max_size=CACHE_SIZE):
+    ## same result as obj_loader.load_obj
+    entry = os.path.join(cache_dir, cache_key(path, scale) + '.npz')
+    if os.path.exists(entry):
+        try:
+            with np.load(entry) as data:
+                mesh = tuple(data[field] for field in _FIELDS)
+            ## a hit counts as a use, so it's the last to be evicted
+            os.utime(entry)
+            return mesh
+        except (OSError, ValueError, KeyError):
+            os.remove(entry)
+
+    mesh = load_obj(path, scale)
+    os.makedirs(cache_dir, exist_ok=True)
+    ## write under a temporary name so an interrupted run never leaves half a file behind
+    temp = entry + '.tmp'
+    with open(temp, 'wb') as file:
+        np.savez(file, **dict(zip(_FIELDS, mesh)))
+    os.replace(temp, entry)
+    evict(cache_dir, max_size, keep=entry)
+    return mesh
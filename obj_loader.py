@@ -0,0 +1,195 @@
+import mmap
+import re
+import numpy as np
+
+## reads .obj files straight out of a memory map, a few MB at a time, into numpy buffers.
+## faces are returned as flat index / offset arrays (see sampling.face_arrays)
+
+CHUNK_SIZE = 1 << 24
+BATCH_SIZE = 1 << 16
+
+_FACE_SUFFIX = re.compile(rb'/\S*')
+
+
+def _chunks (mm, chunk_size):
+    ## byte blocks that always end on a line break, so no record is split in two
+    start = 0
+    size = len(mm)
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            nl = mm.find(b'\n', end - 1)
+            end = size if nl == -1 else nl + 1
+        yield mm[start:end]
+        start = end
+
+def _count_records (mm, chunk_size):
+    v_count = 0
+    f_count = 0
+    for chunk in _chunks(mm, chunk_size):
+        chunk = b'\n' + chunk
+        v_count += chunk.count(b'\nv ')
+        f_count += chunk.count(b'\nf ')
+    return v_count, f_count
+
+def _record_runs (chunk, chars, tag):
+    ## slices of the chunk holding back-to-back lines of one record type, with the tag letters dropped.
+    ## exporters write records in long blocks, so there are only a handful of runs per chunk
+    breaks = np.flatnonzero(chars == 10)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks + 1, [len(chars)]))
+    padded = np.concatenate((chars, [0, 0]))
+    hit = (padded[starts] == tag[0]) & (padded[starts + 1] == 32)
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], hit.astype(np.int8), [0]))))
+    runs = []
+    n = 0
+    for first, last in zip(edges[::2], edges[1::2]):
+        runs.append(chunk[starts[first]:ends[last - 1]].translate(None, tag))
+        n += last - first
+    return runs, n
+
+def _parse_vertexes (runs, n):
+    values = np.fromstring(b'\n'.join(runs), sep=' ')
+    if values.size == 3 * n:
+        return values.reshape(-1, 3)
+    ## some exporters add a w component or vertex colors, only xyz is used
+    lines = b'\n'.join(runs).splitlines()
+    return np.array([l.split()[:3] for l in lines if l.strip()], dtype=np.float64)
+
+def _parse_faces (runs, n):
+    text = _FACE_SUFFIX.sub(b'', b'\n'.join(run.rstrip(b'\r\n') for run in runs))
+    indices = np.fromstring(text, dtype=np.int64, sep=' ') - 1
+
+    ## corners per face: count where a token starts on each line
+    chars = np.frombuffer(text, dtype=np.uint8)
+    blank = (chars == 32) | (chars == 9) | (chars == 13) | (chars == 10)
+    starts = ~blank
+    starts[1:] &= blank[:-1]
+    line_starts = np.concatenate(([0], np.flatnonzero(chars == 10) + 1))
+    counts = np.add.reduceat(starts, line_starts, dtype=np.int64)
+    return indices, counts
+
+def _parse_chunk (chunk, want_vertexes=True, want_faces=True):
+    chars = np.frombuffer(chunk, dtype=np.uint8)
+    vertexes = None
+    faces = None
+    if want_vertexes:
+        runs, n = _record_runs(chunk, chars, b'v')
+        if n:
+            vertexes = _parse_vertexes(runs, n)
+    if want_faces:
+        runs, n = _record_runs(chunk, chars, b'f')
+        if n:
+            faces = _parse_faces(runs, n)
+    return vertexes, faces
+
+def _open (path):
+    with open(path, 'rb') as file:
+        if file.seek(0, 2) == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def normalize_matrix (min_v, max_v, scale):
+    ## same transform parse_obj builds with glm: translate by -diag/2, then scale the longest side to `scale`
+    diag = np.asarray(max_v, dtype=np.float64) - np.asarray(min_v, dtype=np.float64)
+    s = 1 / diag.max() * scale
+    M = np.identity(4)
+    M[:3, :3] *= s
+    M[:3, 3] = -diag / 2 * s
+    return M
+
+def normalize (vertexes, min_v, max_v, scale):
+    ## works in place, vertex buffers can be huge
+    M = normalize_matrix(min_v, max_v, scale)
+    vertexes *= M[0, 0]
+    vertexes += M[:3, 3]
+    return M
+
+def read_vertexes (path, chunk_size=CHUNK_SIZE):
+    mm = _open(path)
+    v_count, _ = _count_records(mm, chunk_size)
+
+    vertexes = np.empty((v_count, 3), dtype=np.float64)
+    min_v = np.full(3, np.inf)
+    max_v = np.full(3, -np.inf)
+    n = 0
+    for chunk in _chunks(mm, chunk_size):
+        v, _ = _parse_chunk(chunk, want_faces=False)
+        if v is None:
+            continue
+        vertexes[n:n + len(v)] = v
+        n += len(v)
+        np.minimum(min_v, v.min(axis=0), out=min_v)
+        np.maximum(max_v, v.max(axis=0), out=max_v)
+    return vertexes, min_v, max_v
+
+def load_obj (path, scale, chunk_size=CHUNK_SIZE):
+    mm = _open(path)
+    v_count, f_count = _count_records(mm, chunk_size)
+
+    vertexes = np.empty((v_count, 3), dtype=np.float64)
+    offsets = np.zeros(f_count + 1, dtype=np.int64)
+    ## corner count isn't known up front, start from triangles and grow
+    indices = np.empty(3 * f_count, dtype=np.int64)
+    min_v = np.full(3, np.inf)
+    max_v = np.full(3, -np.inf)
+
+    n_v = 0
+    n_f = 0
+    for chunk in _chunks(mm, chunk_size):
+        v, f = _parse_chunk(chunk)
+        if v is not None:
+            vertexes[n_v:n_v + len(v)] = v
+            n_v += len(v)
+            np.minimum(min_v, v.min(axis=0), out=min_v)
+            np.maximum(max_v, v.max(axis=0), out=max_v)
+        if f is not None:
+            idx, counts = f
+            start = offsets[n_f]
+            if start + len(idx) > len(indices):
+                indices = np.resize(indices, max(2 * len(indices), start + len(idx)))
+            indices[start:start + len(idx)] = idx
+            np.cumsum(counts, out=offsets[n_f + 1:n_f + 1 + len(counts)])
+            offsets[n_f + 1:n_f + 1 + len(counts)] += start
+            n_f += len(counts)
+
+    normalize(vertexes, min_v, max_v, scale)
+    return vertexes, indices[:offsets[-1]], offsets, min_v, max_v
+
+def iter_obj (path, scale, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+    ## vertexes are read first since every face batch needs them normalized,
+    ## faces then come out in batches of about batch_size while the file is still being read
+    vertexes, min_v, max_v = read_vertexes(path, chunk_size)
+    normalize(vertexes, min_v, max_v, scale)
+    return vertexes, min_v, max_v, iter_faces(path, batch_size, chunk_size)
+
+def iter_faces (path, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+    mm = _open(path)
+    pending_idx = []
+    pending_counts = []
+    pending = 0
+    for chunk in _chunks(mm, chunk_size):
+        _, f = _parse_chunk(chunk, want_vertexes=False)
+        if f is None:
+            continue
+        pending_idx.append(f[0])
+        pending_counts.append(f[1])
+        pending += len(f[1])
+        while pending >= batch_size:
+            idx = np.concatenate(pending_idx)
+            counts = np.concatenate(pending_counts)
+            offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            cut = offsets[batch_size]
+            yield idx[:cut], offsets[:batch_size + 1]
+            pending_idx = [idx[cut:]]
+            pending_counts = [counts[batch_size:]]
+            pending -= batch_size
+    if pending:
+        idx = np.concatenate(pending_idx)
+        counts = np.concatenate(pending_counts)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        yield idx, offsets
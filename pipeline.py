@@ -0,0 +1,117 @@
+import os
+import queue
+import threading
+import numpy as np
+from image_sampling import grid_size, load_pixels, pixel_cloud, pixel_mask
+from obj_loader import BATCH_SIZE, iter_obj
+from sampling import edge_lengths, face_edges, sample_edges
+from serializer import PRECISION, format_rows, open_output, row_format
+
+## streaming version of the generators: a source yields batches, stages turn batches into
+## other batches, and write_stream formats and writes them on a background thread.
+## only a few batches are alive at once, so memory stays flat however many particles come out.
+## edge dedup and welding need the whole point set, so streamed output skips them
+
+## ends write_stream's queue in place of None when the batches failed, so the unfinished file is thrown away
+_ABORT = object()
+
+
+def rebatch (batches, size=BATCH_SIZE):
+    ## regroups row arrays into batches of exactly size rows (the last one can be shorter)
+    pending = []
+    count = 0
+    for batch in batches:
+        pending.append(batch)
+        count += len(batch)
+        while count >= size:
+            rows = np.concatenate(pending)
+            yield rows[:size]
+            pending = [rows[size:]]
+            count -= size
+    if count:
+        yield np.concatenate(pending)
+
+def obj_source (in_name, scale, batch_size=BATCH_SIZE):
+    ## yields (vertexes, indices, offsets), the vertexes are the same array every time
+    vertexes, min_v, max_v, faces = iter_obj(in_name, scale, batch_size)
+    for indices, offsets in faces:
+        yield vertexes, indices, offsets
+
+def edge_sampler (meshes, density, batch_size=BATCH_SIZE):
+    ## the edges of each face batch are split again so every call makes about batch_size points,
+    ## however small the density is
+    for vertexes, indices, offsets in meshes:
+        edges = face_edges(indices, offsets)
+        if len(edges) == 0:
+            continue
+        ends = np.cumsum((edge_lengths(vertexes, edges) / density).astype(np.int64))
+        group = np.maximum(ends - 1, 0) // batch_size
+        for part in np.split(edges, np.flatnonzero(np.diff(group)) + 1):
+            yield sample_edges(vertexes, part, density)
+
+def image_source (img, dx, dy, density, batch_size=BATCH_SIZE, alpha_threshold=None, key_color=None, key_tolerance=0):
+    ## rows of r, g, b, x, z in the same order as from_image, a few columns of pixels at a time.
+    ## the culling options are the same as image_sampling.sample_image
+    width, height = grid_size(dx, dy, density)
+    pixels = load_pixels(img, width, height, 'RGB' if alpha_threshold is None else 'RGBA')
+    step = max(1, batch_size // max(height, 1))
+    for x0 in range(0, width, step):
+        block = pixels[:, x0:x0 + step]
+        cloud = pixel_cloud(block, density, x0)
+        if alpha_threshold is not None or key_color is not None:
+            cloud = cloud.filter(pixel_mask(block, alpha_threshold, key_color, key_tolerance))
+        yield np.column_stack((cloud.float_colors(), cloud.positions[:, 0], cloud.positions[:, 2]))
+
+def write_stream (out_name, header, fmt, batches, queue_size=4):
+    ## formats on this thread and writes on another, so disk writes overlap with sampling.
+    ## returns (rows written, bytes written)
+    blocks = queue.Queue(queue_size)
+    failed = []
+
+    def writer ():
+        ended = False
+        try:
+            with open_output(out_name) as out:
+                out.write(header)
+                block = blocks.get()
+                while block is not None and block is not _ABORT:
+                    out.write(block)
+                    block = blocks.get()
+                ended = True
+                if block is _ABORT:
+                    ## leaving open_output by an exception deletes the .tmp file instead of moving it over out_name
+                    raise RuntimeError(f"Stopped writing {out_name}, the batches failed")
+        except Exception as e:
+            failed.append(e)
+            ## keep taking blocks so the sampling side never blocks on a full queue
+            while not ended:
+                block = blocks.get()
+                ended = block is None or block is _ABORT
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    rows = 0
+    end = _ABORT
+    try:
+        for batch in batches:
+            rows += len(batch)
+            for block in format_rows(fmt, batch):
+                blocks.put(block)
+        end = None
+    finally:
+        blocks.put(end)
+        thread.join()
+    if failed:
+        raise failed[0]
+    return rows, os.path.getsize(out_name)
+
+def stream_obj (in_name, out_name, particle, density, scale, precision=PRECISION, batch_size=BATCH_SIZE):
+    header = "## File created with RiceRocket's Obj particle converter\n\n\n"
+    fmt = row_format([f'particle {particle} ~', ' ~', ' ~', ' 0 0 0 0 1 force @a\n'], precision)
+    points = rebatch(edge_sampler(obj_source(in_name, scale, batch_size), density, batch_size), batch_size)
+    return write_stream(out_name, header, fmt, points)
+
+def stream_image (img, out_name, dx, dy, density, size, precision=PRECISION, batch_size=BATCH_SIZE):
+    header = "## File created with RiceRocket's Obj particle converter\n\n\n"
+    fmt = row_format(['particle dust ', ' ', ' ', f' {size} ~', ' ~ ~', ' 0 0 0 0 1 force\n'], precision)
+    return write_stream(out_name + '.mcfunction', header, fmt, image_source(img, dx, dy, density, batch_size))
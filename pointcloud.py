@@ -0,0 +1,60 @@
+import numpy as np
+
+## one array per attribute instead of a python object per point: positions are float32 (N, 3),
+## colors are uint8 0-255 or float32 0-1 (N, 3), sizes are float32 (N,). colors and sizes are optional.
+## slicing gives views of the same arrays, masks and index arrays copy only the rows they pick
+
+
+def _colors (colors):
+    if colors is None:
+        return None
+    colors = np.asarray(colors)
+    if colors.dtype != np.uint8:
+        colors = colors.astype(np.float32, copy=False)
+    return colors.reshape(-1, 3)
+
+class PointCloud:
+    def __init__ (self, positions, colors=None, sizes=None):
+        self.positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        self.colors = _colors(colors)
+        self.sizes = None if sizes is None else np.asarray(sizes, dtype=np.float32).reshape(-1)
+
+    def __len__ (self):
+        return len(self.positions)
+
+    def __getitem__ (self, key):
+        if isinstance(key, (int, np.integer)):
+            key = slice(key, key + 1 or None)
+        return PointCloud(
+            self.positions[key],
+            None if self.colors is None else self.colors[key],
+            None if self.sizes is None else self.sizes[key],
+        )
+
+    def filter (self, mask):
+        return self[np.asarray(mask, dtype=bool)]
+
+    def float_colors (self):
+        ## colors as 0-1 floats, whichever way they're stored
+        if self.colors is None:
+            return None
+        if self.colors.dtype == np.uint8:
+            return self.colors / 255
+        return self.colors.astype(np.float64)
+
+    @classmethod
+    def concatenate (cls, clouds):
+        clouds = list(clouds)
+        if not clouds:
+            return cls(np.empty((0, 3)))
+        positions = np.concatenate([c.positions for c in clouds])
+        colors = None
+        if all(c.colors is not None for c in clouds):
+            if all(c.colors.dtype == np.uint8 for c in clouds):
+                colors = np.concatenate([c.colors for c in clouds])
+            else:
+                colors = np.concatenate([c.float_colors() for c in clouds])
+        sizes = None
+        if all(c.sizes is not None for c in clouds):
+            sizes = np.concatenate([c.sizes for c in clouds])
+        return cls(positions, colors, sizes)
@@ -0,0 +1,181 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from spatial import thin_points
+
+## faces are kept as two flat arrays: every face's vertex indices back to back,
+## and the offset where each face starts (plus one final offset for the end)
+
+def face_arrays (faces):
+    counts = np.fromiter((len(f) for f in faces), dtype=np.int64, count=len(faces))
+    offsets = np.zeros(len(faces) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    indices = np.fromiter((i for f in faces for i in f), dtype=np.int64, count=offsets[-1])
+    return indices, offsets
+
+def face_edges (indices, offsets):
+    ## each edge runs from the previous corner of the face to the current one,
+    ## so the first corner pairs with the last
+    indices = np.asarray(indices, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    prev = np.arange(len(indices), dtype=np.int64) - 1
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    filled = counts > 0
+    prev[starts[filled]] = starts[filled] + counts[filled] - 1
+    return np.stack((indices[prev], indices), axis=1)
+
+def edge_lengths (vertexes, edges):
+    a = vertexes[edges[:, 0]]
+    b = vertexes[edges[:, 1]]
+    return np.sqrt(np.einsum('ij,ij->i', a - b, a - b))
+
+def sample_edges (vertexes, edges, density):
+    vertexes = np.asarray(vertexes, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+
+    a = vertexes[edges[:, 0]]
+    b = vertexes[edges[:, 1]]
+    n = (edge_lengths(vertexes, edges) / density).astype(np.int64)
+
+    total = int(n.sum())
+    if total == 0:
+        return np.empty((0, 3), dtype=np.float64)
+
+    ## for every sample, which edge it belongs to and its step along that edge
+    edge = np.repeat(np.arange(len(edges)), n)
+    first = np.cumsum(n) - n
+    step = np.arange(total, dtype=np.int64) - first[edge]
+    u = (step / n[edge])[:, None]
+
+    return a[edge] * (1 - u) + u * b[edge]
+
+def solve_edge_density (lengths, budget):
+    ## smallest density whose sample count fits the budget, found from the edge lengths alone.
+    ## edges get floor(length / density) samples each, so total / budget always fits and
+    ## total / (budget + edges) never undershoots, bisect between the two
+    lengths = np.asarray(lengths, dtype=np.float64)
+    total = lengths.sum()
+    if total == 0 or budget <= 0:
+        return np.inf
+    hi = total / budget
+    lo = total / (budget + len(lengths))
+    for _ in range(64):
+        mid = (lo + hi) / 2
+        if mid in (lo, hi):
+            break
+        if (lengths / mid).astype(np.int64).sum() <= budget:
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+## thinned surface samples land at a little over 0.5 per spacing^2 of area
+SURFACE_FILL = 0.5
+
+def solve_surface_spacing (vertexes, indices, offsets, budget):
+    ## aims slightly over the budget, sample_surface's count then trims it to a hard cap
+    areas = triangle_areas(np.asarray(vertexes, dtype=np.float64), triangulate(indices, offsets))
+    return np.sqrt(SURFACE_FILL * areas.sum() / budget)
+
+## below this many edges, starting worker processes costs more than it saves
+PARALLEL_MIN_EDGES = 1 << 16
+
+def _sample_shard (vertex_name, vertex_shape, out_name, out_shape, start, edges, density):
+    vertex_shm = shared_memory.SharedMemory(name=vertex_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        vertexes = np.ndarray(vertex_shape, dtype=np.float64, buffer=vertex_shm.buf)
+        out = np.ndarray(out_shape, dtype=np.float64, buffer=out_shm.buf)
+        points = sample_edges(vertexes, edges, density)
+        out[start:start + len(points)] = points
+        del vertexes, out
+    finally:
+        vertex_shm.close()
+        out_shm.close()
+
+def sample_edges_parallel (vertexes, edges, density, workers=None):
+    ## same output as sample_edges, byte for byte. the edges are split into shards and every
+    ## worker reads one shared copy of the vertexes and writes its samples straight into its
+    ## own slice of a shared output array, so nothing big is pickled either way
+    vertexes = np.asarray(vertexes, dtype=np.float64).reshape(-1, 3)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(edges) < PARALLEL_MIN_EDGES:
+        return sample_edges(vertexes, edges, density)
+
+    shards = np.array_split(edges, workers * 4)
+    counts = [int((edge_lengths(vertexes, shard) / density).astype(np.int64).sum()) for shard in shards]
+    starts = np.cumsum([0] + counts[:-1]).tolist()
+    out_shape = (sum(counts), 3)
+
+    vertex_shm = shared_memory.SharedMemory(create=True, size=max(vertexes.nbytes, 1))
+    out_shm = shared_memory.SharedMemory(create=True, size=max(out_shape[0] * 3 * 8, 1))
+    try:
+        np.ndarray(vertexes.shape, dtype=np.float64, buffer=vertex_shm.buf)[:] = vertexes
+        n = len(shards)
+        with ProcessPoolExecutor(workers) as pool:
+            list(pool.map(_sample_shard, [vertex_shm.name] * n, [vertexes.shape] * n, [out_shm.name] * n, [out_shape] * n, starts, shards, [density] * n))
+        return np.ndarray(out_shape, dtype=np.float64, buffer=out_shm.buf).copy()
+    finally:
+        vertex_shm.close()
+        vertex_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+
+def unique_edges (edges):
+    ## an edge shared by two faces shows up once per face, usually in opposite directions.
+    ## keep the first occurrence of each (min, max) vertex pair, in its original direction
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    canonical = np.sort(edges, axis=1)
+    _, first = np.unique(canonical, axis=0, return_index=True)
+    first.sort()
+    return edges[first], len(edges) - len(first)
+
+def triangulate (indices, offsets):
+    ## fan out every polygon from its first corner
+    indices = np.asarray(indices, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_tri = np.maximum(np.diff(offsets) - 2, 0)
+    face = np.repeat(np.arange(len(n_tri)), n_tri)
+    k = np.arange(len(face), dtype=np.int64) - (np.cumsum(n_tri) - n_tri)[face]
+    start = offsets[face]
+    return np.stack((indices[start], indices[start + k + 1], indices[start + k + 2]), axis=1)
+
+def triangle_areas (vertexes, triangles):
+    a = vertexes[triangles[:, 0]]
+    cross = np.cross(vertexes[triangles[:, 1]] - a, vertexes[triangles[:, 2]] - a)
+    return 0.5 * np.sqrt(np.einsum('ij,ij->i', cross, cross))
+
+## candidates thrown per spacing^2 of surface before thinning, enough that the thinned set is close to full coverage
+SURFACE_OVERSAMPLE = 4
+
+def sample_surface (vertexes, indices, offsets, spacing, count=None, seed=0):
+    ## scatters points over the faces in proportion to their area, then drops any point
+    ## closer than spacing to another. count caps the result, keeping an even spread
+    vertexes = np.asarray(vertexes, dtype=np.float64)
+    triangles = triangulate(indices, offsets)
+    areas = triangle_areas(vertexes, triangles)
+    total = areas.sum()
+    if total == 0:
+        return np.empty((0, 3), dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    n = int(SURFACE_OVERSAMPLE * total / spacing ** 2) + 1
+    tri = triangles[rng.choice(len(triangles), size=n, p=areas / total)]
+
+    ## uniform barycentric coordinates
+    r1 = np.sqrt(rng.random(n))[:, None]
+    r2 = rng.random(n)[:, None]
+    ## built up in place, there can be millions of candidates
+    candidates = vertexes[tri[:, 0]] * (1 - r1)
+    candidates += vertexes[tri[:, 1]] * (r1 * (1 - r2))
+    candidates += vertexes[tri[:, 2]] * (r1 * r2)
+    del tri, r1, r2
+
+    ## candidates are already in random order, so their index is a fair priority
+    keep = thin_points(candidates, spacing, priority=np.arange(n))
+    if count is not None:
+        keep = keep[:count]
+    return candidates[keep]
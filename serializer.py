@@ -0,0 +1,69 @@
+import os
+import filecmp
+import contextlib
+import numpy as np
+
+## writes commands in bulk. a row format is the command text with a fixed precision number
+## slot between each literal piece, and a whole block of rows is formatted with one % call.
+## e.g. row_format(['particle flame ~', ' ~', ' ~', ' 0 0 0 0 1 force @a\n']) takes rows of x, y, z.
+## every output goes through open_output, which leaves a file alone when its bytes didn't change
+
+PRECISION = 4
+BLOCK_SIZE = 1 << 15
+BUFFER_SIZE = 1 << 22
+
+
+_recorded = None
+
+
+@contextlib.contextmanager
+def open_output (out_name, buffering=BUFFER_SIZE):
+    ## writes to out_name.tmp and only moves it over out_name when the bytes differ, so files
+    ## that come out the same keep their modification time and aren't reloaded by the server
+    temp = out_name + '.tmp'
+    try:
+        with open(temp, 'w', buffering=buffering) as out:
+            yield out
+        if os.path.exists(out_name) and filecmp.cmp(temp, out_name, shallow=False):
+            os.remove(temp)
+        else:
+            os.replace(temp, out_name)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    if _recorded is not None:
+        _recorded.append(out_name)
+
+@contextlib.contextmanager
+def record_outputs ():
+    ## collects the path of every file open_output writes while it's active
+    global _recorded
+    _recorded, outer = [], _recorded
+    try:
+        yield _recorded
+    finally:
+        _recorded = outer
+
+def row_format (pieces, precision=PRECISION):
+    number = f'%.{precision}f'
+    return number.join(piece.replace('%', '%%') for piece in pieces)
+
+def format_block (fmt, rows):
+    if len(rows) == 0:
+        return ''
+    return (fmt * len(rows)) % tuple(rows.ravel().tolist())
+
+def format_rows (fmt, rows, block_size=BLOCK_SIZE):
+    ## the formatted commands, as strings of up to block_size lines each
+    rows = np.asarray(rows, dtype=np.float64)
+    if rows.ndim == 1:
+        rows = rows[:, None]
+    for start in range(0, len(rows), block_size):
+        yield format_block(fmt, rows[start:start + block_size])
+
+def write_rows (out_name, header, fmt, rows):
+    ## returns the size of the written file in bytes
+    with open_output(out_name) as out:
+        out.write(header)
+        out.writelines(format_rows(fmt, rows))
+    return os.path.getsize(out_name)
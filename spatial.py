@@ -0,0 +1,149 @@
+import itertools
+import numpy as np
+
+## uniform hash grid over a point set, with cells as wide as the search radius.
+## points are sorted by cell so every cell's points sit in one contiguous run,
+## and neighbours are found by looking up the 27 cells around each point
+
+BLOCK_SIZE = 1 << 18
+THIN_CHUNK = 1 << 17
+## generators weld points closer than this fraction of their spacing by default. samples meant to sit one
+## spacing apart land a rounding error either side of it, so welding at the spacing itself drops half of them
+WELD_FRACTION = 0.5
+
+UNDECIDED, KEPT, DROPPED = 0, 1, 2
+
+## the cell itself plus half of its 26 neighbours, so every pair of cells is visited once
+_HALF_NEIGHBOURS = [d for d in itertools.product((-1, 0, 1), repeat=3) if d > (0, 0, 0)]
+
+
+def _grid (points, radius):
+    cells = np.floor(points / radius).astype(np.int64)
+    ## leave an empty cell of margin on every side so neighbour keys never wrap
+    cells -= cells.min(axis=0) - 1
+    dims = cells.max(axis=0) + 2
+    if int(dims[0]) * int(dims[1]) * int(dims[2]) >= 2 ** 63:
+        raise ValueError(f"Radius {radius} is too small for the extent of the points.")
+    keys = np.ravel_multi_index(tuple(cells.T), tuple(dims))
+    order = np.argsort(keys, kind='stable')
+    return order, keys[order], dims
+
+def close_pairs (points, radius):
+    ## every pair (i, j) with i < j of points closer than radius
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    n = len(points)
+    if n < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    order, sorted_keys, dims = _grid(points, radius)
+    r2 = radius * radius
+
+    found_i = []
+    found_j = []
+    for d in [(0, 0, 0)] + _HALF_NEIGHBOURS:
+        delta = (d[0] * dims[1] + d[1]) * dims[2] + d[2]
+        ## walking the points in cell order keeps the lookups sorted, which is far faster
+        for start in range(0, n, BLOCK_SIZE):
+            src = np.arange(start, min(start + BLOCK_SIZE, n))
+            target = sorted_keys[src] + delta
+            lo = np.searchsorted(sorted_keys, target, 'left')
+            hi = np.searchsorted(sorted_keys, target, 'right')
+            counts = hi - lo
+            total = int(counts.sum())
+            if total == 0:
+                continue
+
+            src = np.repeat(src, counts)
+            pos = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(total)
+            if d == (0, 0, 0):
+                ## inside one cell, only pair each point with the ones sorted after it
+                later = pos > src
+                src = src[later]
+                pos = pos[later]
+            i = order[src]
+            j = order[pos]
+
+            diff = points[i] - points[j]
+            close = np.einsum('ij,ij->i', diff, diff) < r2
+            i = i[close]
+            j = j[close]
+            found_i.append(np.minimum(i, j))
+            found_j.append(np.maximum(i, j))
+
+    if not found_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(found_i), np.concatenate(found_j)
+
+def _independent_set (i, j, priority, state):
+    ## state holds UNDECIDED, KEPT or DROPPED per point and is settled in place from the pairs (i, j).
+    ## each round keeps every point that beats all of its undecided neighbours on priority,
+    ## so a random priority settles in a handful of rounds
+    n = len(state)
+    while True:
+        active = (state[i] == UNDECIDED) & (state[j] == UNDECIDED)
+        i = i[active]
+        j = j[active]
+        if len(i) == 0:
+            state[state == UNDECIDED] = KEPT
+            return state
+
+        blocked = np.zeros(n, dtype=bool)
+        i_first = priority[i] < priority[j]
+        blocked[j[i_first]] = True
+        blocked[i[~i_first]] = True
+
+        chosen = (state == UNDECIDED) & ~blocked
+        state[chosen] = KEPT
+        state[j[chosen[i]]] = DROPPED
+        state[i[chosen[j]]] = DROPPED
+
+def thin_points (points, radius, priority=None, seed=0, chunk_size=THIN_CHUNK):
+    ## keeps a subset where no two points are closer than radius, and every dropped point
+    ## is within radius of a kept one. returns the kept indices in their original order.
+    ## the points are settled chunk_size at a time in slabs along their longest axis, each slab
+    ## only pairing its own points and the points kept within radius of it, so memory follows
+    ## the chunk size instead of the number of close pairs in the whole set
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    n = len(points)
+    if priority is None:
+        priority = np.random.default_rng(seed).permutation(n)
+    priority = np.asarray(priority)
+
+    axis = int(np.argmax(np.ptp(points, axis=0))) if n else 0
+    order = np.argsort(points[:, axis], kind='stable')
+    kept = []
+    for start in range(0, n, chunk_size):
+        chunk = order[start:start + chunk_size]
+
+        ## kept points from earlier slabs close enough to reach into this one
+        reach = points[chunk[0], axis] - radius
+        fence = []
+        for part in reversed(kept):
+            ## slabs are in axis order, once one ends short of the reach so do all before it
+            if len(part) and points[part, axis].max() < reach:
+                break
+            fence.append(part[points[part, axis] >= reach])
+        fence = np.concatenate(fence) if fence else np.empty(0, dtype=np.int64)
+
+        ## fence points start out kept, so they drop their neighbours and take no part otherwise
+        group = np.concatenate((fence, chunk))
+        i, j = close_pairs(points[group], radius)
+        state = np.zeros(len(group), dtype=np.int8)
+        state[:len(fence)] = KEPT
+        state[j[i < len(fence)]] = DROPPED
+        state = _independent_set(i, j, priority[group], state)
+        kept.append(np.sort(chunk[state[len(fence):] == KEPT]))
+
+    if not kept:
+        return np.empty(0, dtype=np.int64)
+    return np.sort(np.concatenate(kept))
+
+def weld_points (points, tolerance, seed=0):
+    ## merges points closer than tolerance into one, returns the indices to keep in order.
+    ## a tolerance of 0 or less keeps everything
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if tolerance <= 0:
+        return np.arange(len(points))
+    return thin_points(points, tolerance, seed=seed)
@@ -1,8 +1,22 @@
 import os
 import glm
 import math
-import shutil
-
+import numpy as np
+from serializer import PRECISION, open_output
+
+PARTICLES = 90
+## particles get the color of the band their color score falls in. the bands between the first
+## and the last split the scores from BAND_LOW to BAND_HIGH evenly, the first and last are open ended
+BAND_LOW = -141
+BAND_HIGH = 53
+## the band starts of the sphere's original six hard-coded ranges, kept so six bands look the same as always
+## (a score the old ranges overlapped on gets the lower band's color)
+LEGACY_STARTS = [-141, -93, -45, -3, 53]
+## score lookups check at most this many ranges in one function before splitting the rest in halves
+TREE_LEAF = 3
+## minecraft's default maxCommandChainLength, the most commands one run of animate (with every function
+## it calls) gets through before the rest are dropped
+CHAIN_LIMIT = 65536
 
 def pick_colors (light, dark, x):
     light_color = glm.vec3(light[0], light[1], light[2])
@@ -17,10 +31,99 @@ def pick_colors (light, dark, x):
     colors.append(dark_color)
     return colors
 
-def create_files (projectname, path, offset, helixcount, rotatespeed, helixdensity, light, dark, radius):
-    os.makedirs(projectname)
-    os.chdir(projectname)
-    os.makedirs('anim')
+def device_pitches (rotatespeed):
+    ## the pitch of the sphere's rotation on every tick since install, swinging rotatespeed degrees a tick
+    ## between straight up and straight down, until it repeats. returns (pitches, loop_start), after the
+    ## last one it carries on from pitches[loop_start] again
+    pitch = 0.0
+    flip = False
+    seen = {}
+    pitches = []
+    while (pitch, flip) not in seen:
+        seen[(pitch, flip)] = len(pitches)
+        pitch = round(min(max(pitch + (rotatespeed if flip else -rotatespeed), -90), 90), 6)
+        if pitch == -90:
+            flip = True
+        elif pitch == 90:
+            flip = False
+        pitches.append(pitch)
+    return pitches, seen[(pitch, flip)]
+
+def sine_scores (helixcount, rotatespeed):
+    ## the sine score for every tick, the height of a point helixcount blocks out along the rotation's
+    ## pitch times 100, rounded down. returns (scores, loop_start) like device_pitches
+    pitches, loop_start = device_pitches(rotatespeed)
+    return [math.floor(round(-helixcount * math.sin(math.radians(p)) * 100, 6)) for p in pitches], loop_start
+
+def sphere_particles (score, helixdensity, radius, offset):
+    ## where anim/particles draws for a sine score, relative to whoever runs animate, and each particle's color score
+    k = np.arange(PARTICLES)
+    yaw = np.radians(k * score * helixdensity)
+    pitch = np.radians(2 * k - 90)
+    forward = np.column_stack((-np.sin(yaw) * np.cos(pitch), -np.sin(pitch), np.cos(yaw) * np.cos(pitch)))
+    return forward * radius + (offset[0], offset[1] + 1, offset[2]), score + 90 - 3 * (k + 1)
+
+def _runs (values):
+    ## (first index, last index, value) for each run of equal values
+    runs = []
+    first = 0
+    for i in range(1, len(values) + 1):
+        if i == len(values) or values[i] != values[first]:
+            runs.append((first, i - 1, values[first]))
+            first = i
+    return runs
+
+def _range (first, last):
+    if first is None:
+        return f'..{last}'
+    if last is None:
+        return f'{first}..'
+    return f'{first}..{last}' if last > first else f'{first}'
+
+def band_starts (bands):
+    ## the first color score of every band but the first
+    if bands < 2:
+        raise ValueError(f"A sphere needs at least 2 color bands, got {bands}")
+    if bands == len(LEGACY_STARTS) + 1:
+        return list(LEGACY_STARTS)
+    return [int(round(x)) for x in np.linspace(BAND_LOW, BAND_HIGH, bands - 1)]
+
+def _search_tree (files, name, function_path, holder, score, cases):
+    ## cases are (first, last, command) in order, with first / last None for an open end. writes
+    ## files[name] to run the command of the case holder's score is in, splitting the cases in halves
+    ## into name_0 and name_1 so a lookup checks about 2 log2(len(cases)) ranges instead of all of them.
+    ## returns how many commands a lookup runs for each case
+    if len(cases) <= TREE_LEAF:
+        files[name] = ''.join(f'execute if score {holder} {score} matches {_range(first, last)} {command}\n' for first, last, command in cases)
+        return [len(cases)] * len(cases)
+    middle = len(cases) // 2
+    split = cases[middle][0]
+    files[name] = f'execute if score {holder} {score} matches ..{split - 1} run function {function_path}/{name}_0\nexecute if score {holder} {score} matches {split}.. run function {function_path}/{name}_1\n'
+    low = _search_tree(files, name + '_0', function_path, holder, score, cases[:middle])
+    high = _search_tree(files, name + '_1', function_path, holder, score, cases[middle:])
+    return [2 + cost for cost in low + high]
+
+def _commands (text):
+    return sum(1 for line in text.split('\n') if line.strip() and not line.startswith('#'))
+
+def _baked_frame (positions, color_scores, colors, starts):
+    lines = []
+    for (x, y, z), band in zip(positions, np.searchsorted(starts, color_scores, side='right')):
+        r, g, b = colors[band]
+        lines.append(f'particle minecraft:dust {r:.{PRECISION}f} {g:.{PRECISION}f} {b:.{PRECISION}f} 0.8 ~{x:.{PRECISION}f} ~{y:.{PRECISION}f} ~{z:.{PRECISION}f} 0 0 0 0 1 force\n')
+    return ''.join(lines)
+
+def create_files (projectname, path, offset, helixcount, rotatespeed, helixdensity, light, dark, radius, bands=6, unroll=None, baked=False, out_dir='.'):
+    ## writes the project folder under out_dir and returns the bytes written. the sine that shapes the
+    ## helix comes from a table of scores indexed by a phase score (see sine_scores) instead of an entity,
+    ## and the sine, the color of each of the bands particles and the baked frame are all picked
+    ## by binary search (see _search_tree). unroll writes the particle loop out, unroll particles per
+    ## function, instead of anim/particles calling itself 90 times deep. baked works the animation out
+    ## here instead, one function of plain particle commands per distinct frame, with no score math per particle
+    starts = band_starts(bands)
+    colors = pick_colors(light, dark, bands - 1)
+    root = os.path.join(out_dir, projectname)
+    os.makedirs(os.path.join(root, 'anim'), exist_ok=True)
 
     projectpath = path + '/' + projectname
 
@@ -28,60 +131,113 @@ def create_files (projectname, path, offset, helixcount, rotatespeed, helixdensi
     score = f'{projectname}.animate_sphere'
     credits = f"## This file was created with RiceRocket's sphere generator.\n## Exported under the project name {projectname}\n\n\n\n"
 
-    with open('install.mcfunction', 'w') as install:
-        install.write(credits)
-        install.write(f'forceload add 0 0\nkill @e[type=area_effect_cloud,tag={rotation_device}]\nsummon area_effect_cloud 0 0 0 \u007bDuration:2147483647,Tags:["{rotation_device}"]\u007d\nscoreboard objectives add {score} dummy\ntellraw @s ["",\u007b"text":"RiceRocket\'s sphere generator installed the objective ","color":"green"\u007d,\u007b"text":"{score}","color":"aqua"\u007d]')
-
-    with open('animate.mcfunction', 'w') as animate:
-        animate.write(credits)
-        animate.write(f'execute as @e[type=area_effect_cloud,tag={rotation_device}] at @s run function {projectpath}/anim/rotate\nfunction {projectpath}/anim/ticking')
-
-    os.chdir('anim')
-
-    with open('ticking.mcfunction', 'w') as ticking:
-        ticking.write(credits)
-        ticking.write(f'tp @s ~{offset[0]} ~{offset[1] + 1} ~{offset[2]} 0 -90\n\nexecute at @e[type=area_effect_cloud,tag={rotation_device}] run summon area_effect_cloud ^ ^ ^{helixcount} \u007bTags:["{projectname}.rotation.sine"]\u007d\nexecute store result score @s {score} run data get entity @e[type=area_effect_cloud,tag={projectname}.rotation.sine,limit=1] Pos[1] 100\n\nscoreboard players set particle {score} 90\nscoreboard players set angle {score} 0\nscoreboard players operation color {score} = @s {score}\nscoreboard players add color {score} 90\n\nexecute run function {projectpath}/anim/particles\ntp @s ~ ~ ~')
-
-    with open('rotate.mcfunction', 'w') as rotate:
-        rotate.write(credits)
-        rotate.write(f'execute unless entity @s[tag={projectname}.rotate.flip] at @s rotated as @s run tp @s ~ ~ ~ ~{rotatespeed * 2} ~-{rotatespeed}\nexecute if entity @s[tag={projectname}.rotate.flip] at @s rotated as @s run tp @s ~ ~ ~ ~{rotatespeed * 2} ~{rotatespeed}\n\nexecute if entity @s[x_rotation=-90] run tag @s add {projectname}.rotate.flip\nexecute if entity @s[x_rotation=90] run tag @s remove {projectname}.rotate.flip')
-
-    colors = pick_colors(light, dark, 5)
-
-    with open('particles.mcfunction', 'w') as particles:
-        particles.write(credits)
-        particles.write(f'scoreboard players remove particle {score} 1\nscoreboard players remove color {score} 3\n\nexecute if score color {score} matches ..-142 at @s run particle minecraft:dust {colors[0][0]} {colors[0][1]} {colors[0][2]} 0.8 ^ ^ ^{radius} 0 0 0 0 1 force\nexecute if score color {score} matches -143..-93 at @s run particle minecraft:dust {colors[1][0]} {colors[1][1]} {colors[1][2]} 0.8 ^ ^ ^{radius} 0 0 0 0 1 force\nexecute if score color {score} matches -94..-45 at @s run particle minecraft:dust {colors[2][0]} {colors[2][1]} {colors[2][2]} 0.8 ^ ^ ^{radius} 0 0 0 0 1 force\nexecute if score color {score} matches -46..-3 at @s run particle minecraft:dust {colors[3][0]} {colors[3][1]} {colors[3][2]} 0.8 ^ ^ ^{radius} 0 0 0 0 1 force\nexecute if score color {score} matches -4..52 at @s run particle minecraft:dust {colors[4][0]} {colors[4][1]} {colors[4][2]} 0.8 ^ ^ ^{radius} 0 0 0 0 1 force\nexecute if score color {score} matches 53.. at @s run particle minecraft:dust {colors[5][0]} {colors[5][1]} {colors[5][2]} 0.8 ^ ^ ^{radius} 0 0 0 0 1 force\n\nexecute at @s run tp @s ~ ~ ~ ~ ~2\nscoreboard players operation angle {score} += @s {score}\nexecute store result entity @s Rotation[0] float {helixdensity} run scoreboard players get angle {score}\nexecute if score particle {score} matches 1.. at @s run function {projectpath}/anim/particles')
-
-replace_files = True
-
-input_projectname = str(input("Name of your project: "))
-
-if os.path.exists(input_projectname):
-    replace_confirm = input("This folder already exists, would you like to replace it? (Y/N): ")
-    if replace_confirm == 'N' or replace_confirm == 'n':
-        replace_files = False
-    else: 
-        replace_files = True
-
-
-if replace_files == True:
-    input_path = str(input("Path of your sphere functions (Ex. example:folder_1/folder_2): "))
-    input_offset = str(input("XYZ offset of the sphere relative to the executer: "))
-    input_helix_count = float(input("\rParticle distribution (Bigger number makes a more solid sphere. Recommended value is 1): "))
-    input_helix_density = float(input("Density of the helix. For essentially one twirl, use 0.08: "))
-    input_rotate_speed = float(input("Rotation speed of the animation. A value of 5 results in approximately a one second rotation: "))
-    input_radius = float(input("Radius of sphere (in blocks): "))
-
-    input_light_color = str(input("Lightest possible color of the sphere (RGB): "))
-    input_dark_color = str(input("Darkest possible color of the sphere (RGB): "))
-
-
-    offset_array = input_offset.split(',')
-    light_color_array = input_light_color.split(',')
-    dark_color_array = input_dark_color.split(',')
-
-    shutil.rmtree(input_projectname)
-
-    create_files (input_projectname, input_path, (float(offset_array[0]), float(offset_array[1]), float(offset_array[2])), input_helix_count, input_rotate_speed, input_helix_density, (float(light_color_array[0]), float(light_color_array[1]), float(light_color_array[2])), (float(dark_color_array[0]), float(dark_color_array[1]), float(dark_color_array[2])), input_radius)
-
-    print(f"\n\nCreated 5 files and 1 directory under the directory '{input_projectname}'")
\ No newline at end of file
+    ## both modes step a phase score through the rotation cycle the old device entity went through
+    scores, loop_start = sine_scores(helixcount, rotatespeed)
+    runs = _runs(scores)
+    run_of = np.repeat(np.arange(len(runs)), [last - first + 1 for first, last, value in runs])
+    cycle = np.arange(loop_start, len(scores))
+    install = f'kill @e[type=area_effect_cloud,tag={rotation_device}]\nkill @e[type=area_effect_cloud,tag={projectname}.rotation.sine]\nscoreboard objectives add {score} dummy\nscoreboard players set phase {score} -1\ntellraw @s ["",\u007b"text":"RiceRocket\'s sphere generator installed the objective ","color":"green"\u007d,\u007b"text":"{score}","color":"aqua"\u007d]'
+    counter = f'scoreboard players add phase {score} 1\nexecute if score phase {score} matches {len(scores)}.. run scoreboard players set phase {score} {loop_start}\n\n'
+
+    files = {}
+    files['install'] = install
+    files['animate'] = counter + f'function {projectpath}/anim/ticking'
+    ticking = f'tp @s ~{offset[0]} ~{offset[1] + 1} ~{offset[2]} 0 -90\n\nfunction {projectpath}/anim/sine\n\n'
+    setup = f'scoreboard players set angle {score} 0\nscoreboard players operation color {score} = @s {score}\nscoreboard players add color {score} 90\n\n'
+    files['anim/ticking'] = ticking + f'scoreboard players set particle {score} 90\n' + setup + f'execute run function {projectpath}/anim/particles\ntp @s ~ ~ ~'
+    files['anim/particles'] = f'scoreboard players remove particle {score} 1\nscoreboard players remove color {score} 3\n\nfunction {projectpath}/anim/color\n\nexecute at @s run tp @s ~ ~ ~ ~ ~2\nscoreboard players operation angle {score} += @s {score}\nexecute store result entity @s Rotation[0] float {helixdensity} run scoreboard players get angle {score}\nexecute if score particle {score} matches 1.. at @s run function {projectpath}/anim/particles'
+    sine_costs = _search_tree(files, 'anim/sine', projectpath, 'phase', score, [(first, last, f'run scoreboard players set @s {score} {value}') for first, last, value in runs])
+    color_cases = [(first, last, f'at @s run particle minecraft:dust {c[0]} {c[1]} {c[2]} 0.8 ^ ^ ^{radius} 0 0 0 0 1 force') for first, last, c in zip([None] + starts, [s - 1 for s in starts] + [None], colors)]
+    color_costs = np.array(_search_tree(files, 'anim/color', projectpath, 'color', score, color_cases))
+
+    color_scores = np.array([sphere_particles(scores[i], helixdensity, radius, offset)[1] for i in cycle])
+    lookup_cost = np.mean([sine_costs[run_of[i]] for i in cycle]) + color_costs[np.searchsorted(starts, color_scores, side='right')].sum(axis=1).mean()
+    runtime_cost = _commands(files['animate']) + _commands(files['anim/ticking']) + PARTICLES * _commands(files['anim/particles']) + lookup_cost
+
+    ## the same loop without the particle counter and the recursive call, ticking runs the parts in turn
+    step = f'scoreboard players remove color {score} 3\nfunction {projectpath}/anim/color\nexecute at @s run tp @s ~ ~ ~ ~ ~2\nscoreboard players operation angle {score} += @s {score}\nexecute store result entity @s Rotation[0] float {helixdensity} run scoreboard players get angle {score}\n'
+    per_part = max(1, min(unroll or PARTICLES, PARTICLES))
+    parts = range(-(-PARTICLES // per_part))
+    unrolled_files = {f'anim/particles_{j}': step * min(per_part, PARTICLES - j * per_part) for j in parts}
+    unrolled_files['anim/ticking'] = ticking + setup + ''.join(f'function {projectpath}/anim/particles_{j}\n' for j in parts) + 'tp @s ~ ~ ~'
+    unrolled_cost = _commands(files['animate']) + sum(_commands(text) for text in unrolled_files.values()) + lookup_cost
+    if unroll:
+        del files['anim/particles']
+        files.update(unrolled_files)
+
+    ## one frame per distinct sine score, animate runs the frame for the current phase. the frames replay the
+    ## helix the runtime mode draws (see sphere_particles) rather than a new layout, so both modes look the same
+    frames = {s: i for i, s in enumerate(sorted(set(scores)))}
+    baked_files = {f'anim/frame_{i}': _baked_frame(*sphere_particles(s, helixdensity, radius, offset), colors, starts) for s, i in frames.items()}
+    baked_files['install'] = install
+    baked_files['animate'] = counter + f'function {projectpath}/anim/frames'
+    frame_costs = _search_tree(baked_files, 'anim/frames', projectpath, 'phase', score, [(first, last, f'run function {projectpath}/anim/frame_{frames[value]}') for first, last, value in runs])
+    baked_cost = _commands(baked_files['animate']) + np.mean([frame_costs[run_of[i]] + _commands(baked_files[f'anim/frame_{frames[scores[i]]}']) for i in cycle])
+
+    print(f"Runtime mode runs {runtime_cost:.0f} commands per tick with the recursive particle loop ({PARTICLES} functions deep), {unrolled_cost:.0f} with it unrolled ({per_part} particles per function).")
+    print(f"Baked mode runs {baked_cost:.0f} commands per tick ({len(frames)} frames).")
+    cost = baked_cost if baked else unrolled_cost if unroll else runtime_cost
+    if cost > CHAIN_LIMIT:
+        print(f"Warning: that's more than the default maxCommandChainLength of {CHAIN_LIMIT}, raise the gamerule or the sphere gets cut off.")
+
+    size = 0
+    written = set()
+    for name, text in (baked_files if baked else files).items():
+        out_name = os.path.join(root, name + '.mcfunction')
+        with open_output(out_name) as out:
+            out.write(credits)
+            out.write(text)
+        size += os.path.getsize(out_name)
+        written.add(os.path.normpath(out_name))
+
+    ## functions an earlier build wrote that this one didn't (the other mode's, old band or sine lookups) are deleted
+    for folder, dirs, names in os.walk(root):
+        for name in names:
+            out_name = os.path.normpath(os.path.join(folder, name))
+            if name.endswith('.mcfunction') and out_name not in written:
+                os.remove(out_name)
+    return size
+
+def main ():
+    replace_files = True
+
+    input_projectname = str(input("Name of your project: "))
+
+    if os.path.exists(input_projectname):
+        replace_confirm = input("This folder already exists, would you like to update it? Functions this build doesn't write are deleted (Y/N): ")
+        if replace_confirm == 'N' or replace_confirm == 'n':
+            replace_files = False
+        else: 
+            replace_files = True
+
+
+    if replace_files == True:
+        input_path = str(input("Path of your sphere functions (Ex. example:folder_1/folder_2): "))
+        input_offset = str(input("XYZ offset of the sphere relative to the executer: "))
+        input_helix_count = float(input("\rParticle distribution (Bigger number makes a more solid sphere. Recommended value is 1): "))
+        input_helix_density = float(input("Density of the helix. For essentially one twirl, use 0.08: "))
+        input_rotate_speed = float(input("Rotation speed of the animation. A value of 5 results in approximately a one second rotation: "))
+        input_radius = float(input("Radius of sphere (in blocks): "))
+
+        input_light_color = str(input("Lightest possible color of the sphere (RGB): "))
+        input_dark_color = str(input("Darkest possible color of the sphere (RGB): "))
+        input_bands = int(input("Number of color bands in the gradient (Ex. 6, more is smoother): ") or 6)
+        while input_bands < 2:
+            input_bands = int(input("The gradient needs at least 2 color bands, how many?: ") or 6)
+        input_unroll = str(input("Write the particle loop out instead of recursing, how many particles per function? Leave blank to keep the loop: ")).strip()
+        input_unroll = int(input_unroll) if input_unroll else None
+        input_baked = str(input("Work the animation out now and write it as plain particle commands? (Y/N): ")).strip().lower() == 'y'
+
+
+        offset_array = input_offset.split(',')
+        light_color_array = input_light_color.split(',')
+        dark_color_array = input_dark_color.split(',')
+
+        ## files are overwritten in place (and only when they change) instead of deleting the folder first,
+        ## create_files deletes the functions it didn't write
+        input_bytes = create_files (input_projectname, input_path, (float(offset_array[0]), float(offset_array[1]), float(offset_array[2])), input_helix_count, input_rotate_speed, input_helix_density, (float(light_color_array[0]), float(light_color_array[1]), float(light_color_array[2])), (float(dark_color_array[0]), float(dark_color_array[1]), float(dark_color_array[2])), input_radius, input_bands, input_unroll, input_baked)
+
+        print(f"\n\nWrote {input_bytes} bytes under the directory '{input_projectname}'")
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,15 @@
 import math
 import glm
+import numpy as np
 from glm import vec3
+from spatial import WELD_FRACTION, weld_points
+from ticks import write_sliced
+from serializer import PRECISION, row_format, write_rows
+from pointcloud import PointCloud
 
-## make each point a tuple of a glm vec3 coordinate, and a color
-## points is a list of the points that have both of these values
+## the spike is built as (positions, colors) arrays (see spike_points) and written from a PointCloud.
+## plot_vertexes, interpolate_w_color and interpolate are the older helpers, where each point is a
+## tuple of a glm vec3 coordinate and a color
 
 def plot_vertexes (width, height, base_color, point_color):
     vertexes = [
@@ -43,47 +49,92 @@ def interpolate (a, b, color, x):
     return face_points
 
 
-def create_mcfunction (out_name, width, height, density, base_color, point_color, size):
+def _counts (a, b, density):
+    ## int(length / density) of every segment, the length worked out in float32 like glm does
+    d = b - a
+    return (np.sqrt((d * d).sum(axis=-1, dtype=np.float32).astype(np.float64)) / density).astype(np.int64)
+
+def _lerp (a, b, u):
+    ## a * (1 - u) + u * b in float32, the same as it comes out of glm
+    u = np.asarray(u)
+    return a * (1 - u).astype(np.float32) + u.astype(np.float32) * b
+
+def _segments (a, b, density):
+    ## every segment from a[k] to b[k] sampled like interpolate does, all at once, with the segment
+    ## each point came from. points are in segment order
+    counts = _counts(a, b, density)
+    segment = np.repeat(np.arange(len(a)), counts)
+    i = np.arange(len(segment)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return _lerp(a[segment], b[segment], (i / counts[segment])[:, None]), segment
+
+def spike_rings (width, height, density, base_color, point_color):
+    ## the corners (rings, 3, 3) and colors (rings, 3) of every triangular ring, from the base up to the
+    ## tip, made by stepping each corner up its side edge like interpolate_w_color
     vertexes = plot_vertexes(width, height, base_color, point_color)
-    points = []
-    edges = []
-    for i in range(0, 3):
-        a = vertexes[i][0]
-        b = vertexes[3][0]
-
-        ca = vertexes[i][1]
-        cb = vertexes[3][1]
-        edges.append(interpolate_w_color(a, b, ca, cb, density))
-    for i in range(0, len(edges[0])):
-        v0 = edges[0][i][0]
-        v1 = edges[1][i][0]
-        v2 = edges[2][i][0]
-
-        color = edges[0][i][1]
-        points += interpolate(v0, v1, color, density)
-        points += interpolate(v1, v2, color, density)
-        points += interpolate(v2, v0, color, density)
-    #print(len(points))
-    #with open(out_name, 'w') as out:
-    #    for i in points:
-    #        out.write(f"particle flame ~{i[0]} ~{i[1]} ~{i[2]} 0 0 0 0 1 force\n")
-    with open(out_name, 'w') as out:
-        out.write("## File created with RiceRocket's spike particle creator\n\n\n")
-        for i in points:
-            out.write(f"particle minecraft:dust {i[1][0]} {i[1][1]} {i[1][2]} {size} ^{i[0][0]} ^{i[0][2]} ^{i[0][1]} 0 0 0 0 1 force @a\n")
-
-input_out = str(input("Name of output file: "))
-input_width = float(input("Width of spike (in blocks): "))
-input_height = float(input("Length of spike (in blocks): "))
-input_density = float(input("Density of particles (in blocks). Recommended values are from 0.1 - 0.3: "))
-input_base_color = str(input("Color of the base of the spike (RGB): "))
-input_point_color = str(input("Color of the point of the spike (RGB): "))
-input_size = float(input("Size of the particles used. Recommended values are from 0.8 - 1: "))
-
-out_file = input_out + '.mcfunction'
-
-base_color_array = input_base_color.split(',')
-point_color_array = input_point_color.split(',')
-
-
-create_mcfunction (out_file, input_width, input_height, input_density, (float(base_color_array[0]), float(base_color_array[1]), float(base_color_array[2])), (float(point_color_array[0]), float(point_color_array[1]), float(point_color_array[2])), input_size)
\ No newline at end of file
+    base = np.array([vertexes[i][0] for i in range(3)], dtype=np.float32)
+    tip = np.array(vertexes[3][0], dtype=np.float32)
+    counts = _counts(base, tip, density)
+    u = np.arange(counts.min())[:, None] / counts
+    corners = _lerp(base, tip, u[..., None])
+    colors = _lerp(np.array(vertexes[0][1], dtype=np.float32), np.array(vertexes[3][1], dtype=np.float32), u[:, :1])
+    return corners, colors
+
+def fill_triangle (a, b, c, density):
+    ## a triangular grid of points density apart on the triangle a, b, c
+    n = max(int(_counts(a, b, density)), 1)
+    i, j = np.triu_indices(n + 1)
+    j = j - i
+    return a + np.outer(i / n, b - a) + np.outer(j / n, c - a)
+
+def spike_points (width, height, density, base_color, point_color, filled=False):
+    ## (positions, colors) of every point of the spike in the order create_mcfunction always made them,
+    ## each ring's three sides in turn. filled also covers the base with a grid of points
+    corners, ring_colors = spike_rings(width, height, density, base_color, point_color)
+    positions, segment = _segments(corners.reshape(-1, 3), corners[:, [1, 2, 0]].reshape(-1, 3), density)
+    colors = ring_colors[segment // 3]
+    if filled and len(corners):
+        base = fill_triangle(corners[0, 0], corners[0, 1], corners[0, 2], density)
+        positions = np.concatenate((positions, base))
+        colors = np.concatenate((colors, np.repeat(ring_colors[:1], len(base), axis=0)))
+    return positions, colors
+
+def create_mcfunction (out_name, width, height, density, base_color, point_color, size, weld=None, chunk_size=None, function_path=None, scheduled=True, precision=PRECISION, filled=False):
+    cloud = PointCloud(*spike_points(width, height, density, base_color, point_color, filled))
+
+    ## ring corners and the spike's tip pile up many particles in one spot, merge the ones closer than the weld distance
+    cloud = cloud[weld_points(cloud.positions, density * WELD_FRACTION if weld is None else weld)]
+    header = "## File created with RiceRocket's spike particle creator\n\n\n"
+    fmt = row_format(['particle minecraft:dust ', ' ', ' ', f' {size} ^', ' ^', ' ^', ' 0 0 0 0 1 force @a\n'], precision)
+    rows = np.column_stack((cloud.float_colors(), cloud.positions[:, [0, 2, 1]]))
+    if chunk_size:
+        return write_sliced(out_name[:-len('.mcfunction')], function_path, header, fmt, rows, chunk_size, scheduled)
+    return write_rows(out_name, header, fmt, rows)
+
+def main ():
+    input_out = str(input("Name of output file: "))
+    input_width = float(input("Width of spike (in blocks): "))
+    input_height = float(input("Length of spike (in blocks): "))
+    input_density = float(input("Density of particles (in blocks). Recommended values are from 0.1 - 0.3: "))
+    input_base_color = str(input("Color of the base of the spike (RGB): "))
+    input_point_color = str(input("Color of the point of the spike (RGB): "))
+    input_size = float(input("Size of the particles used. Recommended values are from 0.8 - 1: "))
+    input_filled = str(input("Fill the base of the spike too? (Y/N): ")).strip().lower() == 'y'
+    input_chunk_size = str(input("Split into functions of at most how many commands? Leave blank to write one function: ")).strip()
+    input_chunk_size = int(input_chunk_size) if input_chunk_size else None
+    input_function_path = None
+    input_scheduled = True
+    if input_chunk_size:
+        input_function_path = str(input("Path of the output functions (Ex. example:folder_1/folder_2): "))
+        input_scheduled = str(input("Run one part per tick instead of all at once? (Y/N): ")).strip().lower() != 'n'
+
+    out_file = input_out + '.mcfunction'
+
+    base_color_array = input_base_color.split(',')
+    point_color_array = input_point_color.split(',')
+
+
+    input_bytes = create_mcfunction (out_file, input_width, input_height, input_density, (float(base_color_array[0]), float(base_color_array[1]), float(base_color_array[2])), (float(point_color_array[0]), float(point_color_array[1]), float(point_color_array[2])), input_size, chunk_size=input_chunk_size, function_path=input_function_path, scheduled=input_scheduled, filled=input_filled)
+    print(f"Wrote {input_bytes} bytes.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import os
+from serializer import open_output, write_rows
+
+## splits rows of commands into numbered functions of at most chunk_size commands
+## (out_name_0.mcfunction, out_name_1.mcfunction, ...) and writes out_name.mcfunction to run them.
+## scheduled runs one part per tick. scheduled functions run at world spawn, so the driver
+## leaves a marker where it was run (facing the same way, for ^ coordinates) and every
+## later part runs at that marker, which is removed after the last part
+
+
+def _write (out_name, header, text):
+    with open_output(out_name) as out:
+        out.write(header)
+        out.write(text)
+    return os.path.getsize(out_name)
+
+def write_sliced (out_name, function_path, header, fmt, rows, chunk_size, scheduled=True):
+    ## out_name is the path without the .mcfunction extension, fmt and rows are as in
+    ## serializer.write_rows. returns the bytes written over all files
+    if not function_path:
+        raise ValueError(f"Slicing {out_name} into parts needs the function_path to run them by")
+    name = os.path.basename(out_name)
+    anchor = f'{name}.anchor'
+    count = -(-len(rows) // chunk_size)
+
+    size = 0
+    for i in range(count):
+        size += write_rows(f'{out_name}_{i}.mcfunction', header, fmt, rows[i * chunk_size:(i + 1) * chunk_size])
+
+    if not scheduled or count < 2:
+        driver = ''.join(f'function {function_path}/{name}_{i}\n' for i in range(count))
+        return size + _write(out_name + '.mcfunction', header, driver)
+
+    driver = f'kill @e[type=marker,tag={anchor}]\nsummon marker ~ ~ ~ {{Tags:["{anchor}"]}}\ntp @e[type=marker,tag={anchor}] ~ ~ ~ ~ ~\n\n'
+    driver += f'function {function_path}/{name}_0\n'
+    driver += ''.join(f'schedule function {function_path}/{name}_tick{i} {i}t\n' for i in range(1, count))
+    size += _write(out_name + '.mcfunction', header, driver)
+
+    for i in range(1, count):
+        step = f'execute as @e[type=marker,tag={anchor},limit=1] at @s run function {function_path}/{name}_{i}\n'
+        if i == count - 1:
+            step += f'kill @e[type=marker,tag={anchor}]\n'
+        size += _write(f'{out_name}_tick{i}.mcfunction', header, step)
+    return size